@@ -54,6 +54,9 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+
+    # Opt-in request profiling (needs request.user); removes itself when TRIPS_PROFILING is off
+    "trips.profiling.ProfilingMiddleware",
 ]
 
 ROOT_URLCONF = "server.urls"
@@ -92,6 +95,32 @@ DATABASES = DATABASES if "DATABASES" in globals() else {
     }
 }
 
+# --------------------------------------------------------------------------------------
+# Planner cache (geocodes/routes) — see trips/cache.py
+# --------------------------------------------------------------------------------------
+# "sqlite" is shared by all gunicorn workers on the host; "memory" is per-process
+TRIPS_CACHE_BACKEND = os.environ.get("TRIPS_CACHE_BACKEND", "sqlite").strip().lower()
+TRIPS_CACHE_PATH = os.environ.get("TRIPS_CACHE_PATH", str(BASE_DIR / "var" / "trips-cache.sqlite3"))
+TRIPS_CACHE_MAX_BYTES = int(os.environ.get("TRIPS_CACHE_MAX_MB", "64")) * 1024 * 1024
+# Written by `manage.py export_cache_snapshot`, loaded at startup by server/wsgi.py
+TRIPS_CACHE_SNAPSHOT = os.environ.get("TRIPS_CACHE_SNAPSHOT", str(BASE_DIR / "var" / "cache-snapshot.jsonl.gz"))
+
+# --------------------------------------------------------------------------------------
+# Planning time budget — when ORS routing is slower, the plan is answered from a
+# straight-line estimate ("degraded": true) and refined in the background
+# --------------------------------------------------------------------------------------
+TRIPS_PLAN_BUDGET_SECONDS = float(os.environ.get("TRIPS_PLAN_BUDGET_SECONDS", "5"))
+
+# --------------------------------------------------------------------------------------
+# Request profiling — see trips/profiling.py (off by default; zero cost when off)
+# --------------------------------------------------------------------------------------
+TRIPS_PROFILING = os.environ.get("TRIPS_PROFILING", "False").lower() in ("1", "true", "yes", "on")
+TRIPS_PROFILE_DIR = os.environ.get("TRIPS_PROFILE_DIR", str(BASE_DIR / "var" / "profiles"))
+TRIPS_PROFILE_MAX_FILES = int(os.environ.get("TRIPS_PROFILE_MAX_FILES", "200"))
+TRIPS_PROFILE_SAMPLE_RATE = float(os.environ.get("TRIPS_PROFILE_SAMPLE_RATE", "0"))
+TRIPS_PROFILE_TOKEN = os.environ.get("TRIPS_PROFILE_TOKEN", "").strip()  # enables the X-Profile header
+TRIPS_PROFILE_MODE = os.environ.get("TRIPS_PROFILE_MODE", "cprofile").strip().lower()  # or "sample"
+
 # --------------------------------------------------------------------------------------
 # Password validation
 # --------------------------------------------------------------------------------------
@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'server.settings')
 
 application = get_wsgi_application()
+
+# Warm the planner caches from the last snapshot. With `gunicorn --preload` this
+# runs once in the master and the forked workers inherit the warm cache.
+from trips.cache import get_cache, warm_from_snapshot  # noqa: E402
+
+warm_from_snapshot()
+# SQLite connections must not cross fork(): close the master's, workers open their own.
+get_cache().close()
@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import TripPlan
+
+
+@admin.register(TripPlan)
+class TripPlanAdmin(admin.ModelAdmin):
+    list_display = ("id", "public_id", "distance_miles", "duration_seconds", "parent", "created_at")
+    readonly_fields = ("created_at",)
+    exclude = ("line_coords",)  # can be tens of thousands of points
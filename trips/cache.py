@@ -0,0 +1,481 @@
+# trips/cache.py
+"""
+Cache tiers for geocodes, routes and other planner inputs.
+
+Two interchangeable backends:
+- MemoryCache: per-process LRU. Handy for local dev and tests, but every
+  gunicorn worker gets its own cold copy.
+- SharedCache: SQLite file in WAL mode shared by all workers on the host.
+  Readers never block on the writer, entries survive restarts, and the
+  file is kept under a byte budget with least-recently-used eviction.
+
+Both expose the same interface:
+    get(namespace, key, default=None)
+    set(namespace, key, value)
+    add(namespace, key, value) -> bool     # set only if absent
+    delete(namespace, key)
+    clear(namespace=None)
+    hottest(namespace, limit) -> [(key, value), ...]
+    stats() -> {namespace: {"hits", "misses", "sets", "evictions",
+                            "hit_rate", "entries", "bytes"}}
+    close()                                # release this thread's handles
+
+Values must be JSON-serializable (lists/dicts/numbers/strings). Hit/miss/set
+counters are per process; entry and byte counts reflect the backing store.
+
+A cache must never break a request: backend errors are logged and treated
+as misses (reads) or no-ops (writes).
+
+Configured from Django settings:
+    TRIPS_CACHE_BACKEND    "sqlite" (default) or "memory"
+    TRIPS_CACHE_PATH       SQLite file path
+    TRIPS_CACHE_MAX_BYTES  size budget for stored values
+    TRIPS_CACHE_SNAPSHOT   snapshot file loaded at startup (see warm_from_snapshot)
+
+Snapshots are gzip'd JSON lines: a header line {"version", "created_at"}
+followed by one {"namespace", "key", "value"} line per entry.
+"""
+
+from __future__ import annotations
+import gzip
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+EVICT_TO_FRACTION = 0.9   # evict down to 90% of the budget to avoid evicting on every set
+TOUCH_INTERVAL = 60.0     # seconds; refresh LRU timestamps at most this often per entry
+SNAPSHOT_VERSION = 1
+SNAPSHOT_NAMESPACES = ("geocode", "route")
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+class _Counters:
+    """Per-namespace hit/miss/set/eviction counters (thread-safe)."""
+
+    FIELDS = ("hits", "misses", "sets", "evictions")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data: Dict[str, Dict[str, int]] = {}
+
+    def incr(self, namespace: str, field: str, n: int = 1):
+        with self._lock:
+            ns = self._data.setdefault(namespace, dict.fromkeys(self.FIELDS, 0))
+            ns[field] += n
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {ns: dict(c) for ns, c in self._data.items()}
+
+
+def _merge_stats(counters: Dict[str, Dict[str, int]], sizes: Dict[str, Tuple[int, int]]) -> Dict[str, Dict]:
+    out: Dict[str, Dict] = {}
+    for ns in sorted(set(counters) | set(sizes)):
+        c = counters.get(ns) or dict.fromkeys(_Counters.FIELDS, 0)
+        entries, nbytes = sizes.get(ns, (0, 0))
+        lookups = c["hits"] + c["misses"]
+        out[ns] = {
+            **c,
+            "hit_rate": round(c["hits"] / lookups, 4) if lookups else 0.0,
+            "entries": entries,
+            "bytes": nbytes,
+        }
+    return out
+
+
+class MemoryCache:
+    """
+    In-process LRU bounded by the serialized size of stored values.
+
+    Values are kept serialized, like SharedCache: every get returns a fresh
+    copy (callers may mutate it) with the same JSON types (tuples -> lists).
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Tuple[str, str], Tuple[str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._counters = _Counters()
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get((namespace, key))
+            if item is not None:
+                self._data.move_to_end((namespace, key))
+        if item is None:
+            self._counters.incr(namespace, "misses")
+            return default
+        self._counters.incr(namespace, "hits")
+        return json.loads(item[0])
+
+    def set(self, namespace: str, key: str, value: Any):
+        payload = _dumps(value)
+        size = len(payload)
+        evicted: List[str] = []
+        with self._lock:
+            old = self._data.pop((namespace, key), None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._data[(namespace, key)] = (payload, size)
+            self._bytes += size
+            if self._bytes > self.max_bytes:
+                target = self.max_bytes * EVICT_TO_FRACTION
+                while self._data and self._bytes > target:
+                    (ns, _), (_, sz) = self._data.popitem(last=False)
+                    self._bytes -= sz
+                    evicted.append(ns)
+        self._counters.incr(namespace, "sets")
+        for ns in evicted:
+            self._counters.incr(ns, "evictions")
+
+    def add(self, namespace: str, key: str, value: Any) -> bool:
+        with self._lock:
+            if (namespace, key) in self._data:
+                return False
+        self.set(namespace, key, value)
+        return True
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            old = self._data.pop((namespace, key), None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def clear(self, namespace: str | None = None):
+        with self._lock:
+            if namespace is None:
+                self._data.clear()
+                self._bytes = 0
+                return
+            for k in [k for k in self._data if k[0] == namespace]:
+                self._bytes -= self._data.pop(k)[1]
+
+    def hottest(self, namespace: str, limit: int) -> List[Tuple[str, Any]]:
+        with self._lock:
+            items = [(k[1], v[0]) for k, v in reversed(self._data.items()) if k[0] == namespace]
+        return [(k, json.loads(v)) for k, v in items[:limit]]
+
+    def stats(self) -> Dict[str, Dict]:
+        sizes: Dict[str, Tuple[int, int]] = {}
+        with self._lock:
+            for (ns, _), (_, sz) in self._data.items():
+                n, b = sizes.get(ns, (0, 0))
+                sizes[ns] = (n + 1, b + sz)
+        return _merge_stats(self._counters.snapshot(), sizes)
+
+    def close(self):
+        pass
+
+
+class SharedCache:
+    """
+    SQLite (WAL) key-value store shared by every process on the host.
+
+    One connection per thread per process: connections opened in the
+    gunicorn --preload master are never reused in forked workers.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS entries (
+            namespace   TEXT NOT NULL,
+            key         TEXT NOT NULL,
+            value       TEXT NOT NULL,
+            size        INTEGER NOT NULL,
+            accessed_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at);
+
+        -- running byte total, kept in the same transaction as every insert/update/delete
+        CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        INSERT OR IGNORE INTO meta (name, value)
+            VALUES ('bytes', (SELECT COALESCE(SUM(size), 0) FROM entries));
+        CREATE TRIGGER IF NOT EXISTS entries_bytes_ins AFTER INSERT ON entries BEGIN
+            UPDATE meta SET value = value + NEW.size WHERE name = 'bytes';
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_bytes_upd AFTER UPDATE OF size ON entries BEGIN
+            UPDATE meta SET value = value + NEW.size - OLD.size WHERE name = 'bytes';
+        END;
+        CREATE TRIGGER IF NOT EXISTS entries_bytes_del AFTER DELETE ON entries BEGIN
+            UPDATE meta SET value = value - OLD.size WHERE name = 'bytes';
+        END;
+    """
+
+    def __init__(self, path: str | os.PathLike, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = str(path)
+        self.max_bytes = int(max_bytes)
+        self._local = threading.local()
+        self._counters = _Counters()
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+
+    def _connect(self, timeout: float) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            self._local.conn = conn = self._connect(timeout=5.0)
+            self._local.touch_conn = None
+            self._local.pid = os.getpid()
+        return conn
+
+    def _touch_conn(self) -> sqlite3.Connection:
+        """Connection with no busy timeout: LRU touches are skipped, never waited for."""
+        self._conn()
+        if self._local.touch_conn is None:
+            self._local.touch_conn = self._connect(timeout=0.0)
+        return self._local.touch_conn
+
+    def get(self, namespace: str, key: str, default: Any = None) -> Any:
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT value, accessed_at FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+        except sqlite3.Error:
+            logger.warning("cache read failed (%s/%s)", namespace, key, exc_info=True)
+            row = None
+        if row is None:
+            self._counters.incr(namespace, "misses")
+            return default
+        self._counters.incr(namespace, "hits")
+
+        now = time.time()
+        if now - row[1] > TOUCH_INTERVAL:
+            try:
+                self._touch_conn().execute(
+                    "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key),
+                )
+            except sqlite3.Error:
+                pass  # LRU bookkeeping only; skip it while another worker holds the write lock
+        return json.loads(row[0])
+
+    def set(self, namespace: str, key: str, value: Any):
+        payload = _dumps(value)
+        try:
+            conn = self._conn()
+            conn.execute(
+                "INSERT INTO entries (namespace, key, value, size, accessed_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET "
+                "value = excluded.value, size = excluded.size, accessed_at = excluded.accessed_at",
+                (namespace, key, payload, len(payload), time.time()),
+            )
+            self._counters.incr(namespace, "sets")
+            self._evict(conn)
+        except sqlite3.Error:
+            logger.warning("cache write failed (%s/%s)", namespace, key, exc_info=True)
+
+    def add(self, namespace: str, key: str, value: Any) -> bool:
+        payload = _dumps(value)
+        try:
+            conn = self._conn()
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO entries (namespace, key, value, size, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, payload, len(payload), time.time()),
+            )
+            if not cur.rowcount:
+                return False
+            self._counters.incr(namespace, "sets")
+            self._evict(conn)
+        except sqlite3.Error:
+            logger.warning("cache write failed (%s/%s)", namespace, key, exc_info=True)
+            return False
+        return True
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        to_free = total - self.max_bytes * EVICT_TO_FRACTION
+        victims = []
+        for ns, key, size in conn.execute("SELECT namespace, key, size FROM entries ORDER BY accessed_at"):
+            victims.append((ns, key))
+            to_free -= size
+            if to_free <= 0:
+                break
+        conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", victims)
+        for ns, _ in victims:
+            self._counters.incr(ns, "evictions")
+
+    def delete(self, namespace: str, key: str):
+        try:
+            self._conn().execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error:
+            logger.warning("cache delete failed (%s/%s)", namespace, key, exc_info=True)
+
+    def clear(self, namespace: str | None = None):
+        try:
+            conn = self._conn()
+            if namespace is None:
+                conn.execute("DELETE FROM entries")
+            else:
+                conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+        except sqlite3.Error:
+            logger.warning("cache clear failed (%s)", namespace or "all", exc_info=True)
+
+    def hottest(self, namespace: str, limit: int) -> List[Tuple[str, Any]]:
+        try:
+            rows = self._conn().execute(
+                "SELECT key, value FROM entries WHERE namespace = ? ORDER BY accessed_at DESC LIMIT ?",
+                (namespace, int(limit)),
+            ).fetchall()
+        except sqlite3.Error:
+            logger.warning("cache read failed (%s hottest)", namespace, exc_info=True)
+            rows = []
+        return [(k, json.loads(v)) for k, v in rows]
+
+    def stats(self) -> Dict[str, Dict]:
+        try:
+            rows = self._conn().execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(size), 0) FROM entries GROUP BY namespace"
+            ).fetchall()
+        except sqlite3.Error:
+            logger.warning("cache stats failed", exc_info=True)
+            rows = []
+        sizes = {ns: (n, b) for ns, n, b in rows}
+        return _merge_stats(self._counters.snapshot(), sizes)
+
+    def close(self):
+        """Close this thread's connections; the next call reopens them."""
+        for name in ("conn", "touch_conn"):
+            conn = getattr(self._local, name, None)
+            if conn is not None and self._local.pid == os.getpid():
+                conn.close()
+            setattr(self._local, name, None)
+
+
+# --- process-wide instance -----------------------------------------------------
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _build_from_settings():
+    from django.conf import settings
+
+    backend = getattr(settings, "TRIPS_CACHE_BACKEND", "sqlite")
+    max_bytes = getattr(settings, "TRIPS_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+    if backend == "memory":
+        return MemoryCache(max_bytes=max_bytes)
+    if backend == "sqlite":
+        return SharedCache(getattr(settings, "TRIPS_CACHE_PATH"), max_bytes=max_bytes)
+    raise ValueError(f"Unknown TRIPS_CACHE_BACKEND: {backend!r}")
+
+
+def get_cache():
+    """
+    Return the configured cache (built once per process). If the SQLite file
+    can't be opened, falls back to a per-process MemoryCache.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = _build_from_settings()
+                except (OSError, sqlite3.Error):
+                    logger.warning("shared cache unavailable; using a per-process memory cache", exc_info=True)
+                    from django.conf import settings
+                    _cache = MemoryCache(max_bytes=getattr(settings, "TRIPS_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    return _cache
+
+
+# --- snapshots -------------------------------------------------------------------
+
+def export_snapshot(
+    cache,
+    path: str | os.PathLike,
+    namespaces: Iterable[str] = SNAPSHOT_NAMESPACES,
+    limit: int = 1000,
+) -> Dict[str, int]:
+    """
+    Write the `limit` most recently used entries of each namespace to `path`.
+    The file is replaced atomically. Returns {namespace: entries_written}.
+    """
+    path = str(path)
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp = f"{path}.tmp"
+    written: Dict[str, int] = {}
+    with gzip.open(tmp, "wt", encoding="utf-8") as fh:
+        fh.write(_dumps({"version": SNAPSHOT_VERSION, "created_at": time.time()}) + "\n")
+        for ns in namespaces:
+            entries = cache.hottest(ns, limit)
+            # oldest first, so loading into an LRU leaves the hottest entries most recent
+            for key, value in reversed(entries):
+                fh.write(_dumps({"namespace": ns, "key": key, "value": value}) + "\n")
+            written[ns] = len(entries)
+    os.replace(tmp, path)
+    return written
+
+
+def load_snapshot(cache, path: str | os.PathLike) -> Dict[str, int]:
+    """
+    Load a snapshot written by export_snapshot. Returns {namespace: entries_loaded}.
+
+    Keys already in the cache are kept as they are: a persistent backend may
+    hold newer values than the snapshot, and their LRU position is preserved.
+    """
+    loaded: Dict[str, int] = {}
+    with gzip.open(str(path), "rt", encoding="utf-8") as fh:
+        header = json.loads(fh.readline() or "{}")
+        if header.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(f"Unsupported cache snapshot version: {header.get('version')!r}")
+        for line in fh:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if cache.add(item["namespace"], item["key"], item["value"]):
+                loaded[item["namespace"]] = loaded.get(item["namespace"], 0) + 1
+    return loaded
+
+
+def warm_from_snapshot(path: str | os.PathLike | None = None) -> Dict[str, int]:
+    """
+    Startup hook: load TRIPS_CACHE_SNAPSHOT (if present) into the configured cache
+    and log how long it took. Called from server/wsgi.py, so with
+    `gunicorn --preload` it runs once in the master and workers inherit the result.
+    Never raises: a bad snapshot only costs a cold start.
+    """
+    if path is None:
+        from django.conf import settings
+        path = getattr(settings, "TRIPS_CACHE_SNAPSHOT", "")
+    if not path or not os.path.exists(path):
+        return {}
+
+    started = time.perf_counter()
+    try:
+        loaded = load_snapshot(get_cache(), path)
+    except Exception:
+        logger.exception("cache warm-up from %s failed", path)
+        return {}
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    logger.info(
+        "cache warm-up: loaded %s from %s in %.1f ms",
+        ", ".join(f"{n} {ns}" for ns, n in sorted(loaded.items())) or "nothing",
+        path,
+        elapsed_ms,
+    )
+    return loaded
@@ -0,0 +1,34 @@
+# trips/deadline.py
+"""
+Per-request time budget, passed through the planning stages:
+
+    deadline = Deadline(settings.TRIPS_PLAN_BUDGET_SECONDS)
+    geocode(text, deadline=deadline)               # HTTP timeout capped by what is left
+    future.result(timeout=deadline.remaining())    # stop waiting on a slow route
+"""
+
+from __future__ import annotations
+import time
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.budget = float(seconds)
+        self.expires_at = time.monotonic() + self.budget
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def timeout(self, cap: float) -> float:
+        """HTTP timeout for the next call: `cap`, or less if the budget runs out sooner."""
+        if self.expired:
+            raise DeadlineExceeded(f"planning budget of {self.budget:g}s exhausted")
+        return min(float(cap), self.remaining())
@@ -4,12 +4,17 @@ HOS planner for property-carrying drivers (70/8 cycle, no adverse conditions).
 Rules implemented:
 - 70 hours in 8 days (cycle). If exceeded, insert a 34h reset (24h off + next day continues;
   total off-duty across the reset boundary is >=34h).
-- Max 11h DRIVING per day.
+- Max 11h DRIVING per day, and no driving once the 70h cycle is used up.
 - Max 14h ON-DUTY window per day (driving + on-duty-not-driving).
-- 30 min break required after 8h of DRIVING (fueling can satisfy it as on-duty-not-driving).
+- 30 min break required after 8h of DRIVING since the last one (fueling can satisfy it as
+  on-duty-not-driving).
 - +1h on-duty for pickup (day 1) and +1h for dropoff (final day).
 - Fueling every 1,000 miles, modeled as 0.5h on-duty-not-driving each.
 
+Resuming mid-trip (re-planning): pass the driver's clocks for the current day
+(hours_driven_today, duty_window_used, break_taken) and pickup_pending=False once
+the load is picked up. Day 1 of the output is then the remainder of today.
+
 Outputs:
 logs: [
   {
@@ -35,6 +40,8 @@ BREAK_AFTER_DRIVING = 8.0
 BREAK_DURATION = 0.5  # 30 minutes
 OFF_DUTY_MIN = 10.0   # overnight
 CYCLE_MAX = 70.0
+CYCLE_DAYS = 8
+RESTART_HOURS = 34.0  # consecutive off-duty hours that reset the 70/8 cycle
 
 PICKUP_HOURS = 1.0
 DROPOFF_HOURS = 1.0
@@ -55,6 +62,11 @@ def build_daily_logs(
     distance_miles: float,
     route_drive_seconds: float,
     current_cycle_used_hours: float,
+    *,
+    hours_driven_today: float = 0.0,
+    duty_window_used: float = 0.0,
+    break_taken: bool = False,
+    pickup_pending: bool = True,
 ) -> List[Dict]:
     drive_hours_total = max(route_drive_seconds / 3600.0, 0.0)
     fuel_stops = int(distance_miles // FUEL_EVERY_MILES)
@@ -75,45 +87,64 @@ def build_daily_logs(
         segments: List[Dict] = []
         duty_left = DAILY_DUTY_MAX
         driving_today = 0.0
-        break_done = False
+        driving_since_break = 0.0  # any 30-min non-driving interruption resets this
+        elapsed_before = 0.0  # hours of today already behind us when resuming
 
-        # PICKUP on Day 1
         if day == 1:
+            elapsed_before = min(max(float(duty_window_used or 0.0), 0.0), DAILY_DUTY_MAX)
+            duty_left -= elapsed_before
+            driving_today = min(max(float(hours_driven_today or 0.0), 0.0), DAILY_DRIVE_MAX)
+            # Without a break yet, everything driven today counts toward the 8h;
+            # with one, assume it came just before resuming.
+            driving_since_break = 0.0 if break_taken else driving_today
+
+        # PICKUP on Day 1
+        if day == 1 and pickup_pending:
             need = min(PICKUP_HOURS, duty_left)
             _add(segments, "on_duty_not_driving", need, "Pickup")
             cycle_used += need
             duty_left -= need
 
         # driving loop for the day
-        while duty_left > 0 and remaining_drive > 0:
+        while duty_left > 0 and remaining_drive > 0 and driving_today < DAILY_DRIVE_MAX:
             # Insert 30-min break after 8h DRIVING if not satisfied yet.
-            if (driving_today >= BREAK_AFTER_DRIVING) and not break_done:
+            if driving_since_break >= BREAK_AFTER_DRIVING - 1e-9:
                 # Prefer using fueling (counts as break)
                 if remaining_fuels > 0 and duty_left >= FUEL_DURATION:
                     _add(segments, "on_duty_not_driving", FUEL_DURATION, "Fuel (break)")
                     cycle_used += FUEL_DURATION
                     duty_left -= FUEL_DURATION
                     remaining_fuels -= 1
-                    break_done = True
+                    driving_since_break = 0.0
                     hours_since_last_fuel = 0.0
                     continue
                 # Otherwise off-duty 30min
                 if duty_left >= BREAK_DURATION:
                     _add(segments, "off_duty", BREAK_DURATION, "30-min break")
                     duty_left -= BREAK_DURATION
-                    break_done = True
+                    driving_since_break = 0.0
                     continue
                 break  # no more duty time to place break
 
+            # Out of 70/8 cycle hours: stop driving; the 34h reset follows this day
+            if cycle_used >= CYCLE_MAX - 1e-9:
+                break
+
             # Determine how much we can drive next
             drive_cap_by_rule = DAILY_DRIVE_MAX - driving_today
+            drive_cap_by_cycle = CYCLE_MAX - cycle_used
+            # Never drive past the 8h mark since the last break
+            drive_cap_by_break = BREAK_AFTER_DRIVING - driving_since_break
             drive_cap_by_window = duty_left
             drive_cap_by_remaining = remaining_drive
             # Keep fuels even: drive until the next fuel interval if any left
             to_next_fuel = fuel_interval_hours - hours_since_last_fuel if remaining_fuels > 0 else drive_cap_by_remaining
             drive_chunk = max(
                 0.0,
-                min(drive_cap_by_rule, drive_cap_by_window, drive_cap_by_remaining, to_next_fuel),
+                min(
+                    drive_cap_by_rule, drive_cap_by_window, drive_cap_by_cycle, drive_cap_by_break,
+                    drive_cap_by_remaining, to_next_fuel,
+                ),
             )
             if drive_chunk <= 0.0:
                 break
@@ -121,6 +152,7 @@ def build_daily_logs(
             _add(segments, "driving", drive_chunk)
             remaining_drive -= drive_chunk
             driving_today += drive_chunk
+            driving_since_break += drive_chunk
             duty_left -= drive_chunk
             cycle_used += drive_chunk
             hours_since_last_fuel += drive_chunk
@@ -132,8 +164,8 @@ def build_daily_logs(
                 duty_left -= FUEL_DURATION
                 remaining_fuels -= 1
                 hours_since_last_fuel = 0.0
-                if not break_done and driving_today >= BREAK_AFTER_DRIVING and FUEL_DURATION >= BREAK_DURATION:
-                    break_done = True
+                if FUEL_DURATION >= BREAK_DURATION:
+                    driving_since_break = 0.0
 
             # If we maxed daily driving, stop for the day
             if driving_today >= DAILY_DRIVE_MAX:
@@ -149,7 +181,7 @@ def build_daily_logs(
 
         # Overnight rest to complete the 24h period (ensure >=10h)
         # Compute how many hours used so far today
-        used_today = sum(s["hours"] for s in segments)
+        used_today = elapsed_before + sum(s["hours"] for s in segments)
         off_needed = max(OFF_DUTY_MIN, 24.0 - used_today)
         _add(segments, "off_duty", off_needed, "Rest")
 
@@ -163,7 +195,7 @@ def build_daily_logs(
                 logs.append({"day": day, "segments": [{"status": "off_duty", "hours": 24.0, "note": "34h reset (part 1/2)"}]})
                 day += 1
                 # Next day will still begin with at least 10h off-duty (part 2/2) before any duty.
-                logs.append({"day": day, "segments": [{"status": "off_duty", "hours": 10.0, "note": "34h reset (part 2/2)"}]})
+                logs.append({"day": day, "segments": [{"status": "off_duty", "hours": RESTART_HOURS - 24.0, "note": "34h reset (part 2/2)"}]})
                 day += 1
                 cycle_used = 0.0  # reset cycle
                 # After this, the loop will create the next working day normally.
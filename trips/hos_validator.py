@@ -0,0 +1,213 @@
+# trips/hos_validator.py
+"""
+HOS compliance checks for recorded driver logs (the audit side of trips.hos).
+
+Input is the same day/segment shape the planner emits, per driver:
+{
+  "driver_id": "D-102",
+  "cycle_used_before": 12.5,          # optional: on-duty hours in the 7 days before the first log day
+  "logs": [
+    {"day": 1, "segments": [{"status": "driving", "hours": 5.5}, ...]},
+    ...
+  ]
+}
+
+Rules (limits are the planner's constants, so the two cannot drift apart):
+- 11h_driving:  > DAILY_DRIVE_MAX hours driving since the last OFF_DUTY_MIN-hour rest.
+- 14h_window:   driving after DAILY_DUTY_MAX hours since the first on-duty hour of the shift.
+- 30min_break:  > BREAK_AFTER_DRIVING hours driving without a BREAK_DURATION non-driving interruption.
+- 70h_8day:     driving with > CYCLE_MAX on-duty hours in the last CYCLE_DAYS days
+                (since the last RESTART_HOURS-hour restart).
+
+Segments are laid end to end on one clock, so rests that span midnight count
+as one period. Each driver is checked in a single pass over running sums of
+driving / on-duty / clock hours; the 8-day window is a difference of two
+running sums found by bisecting the day index. Limits and rest thresholds
+are applied with a TOLERANCE-hour margin, so rounding in the logs (e.g. the
+planner's 4.41 + 4.41 + 2.19 = 11.01h) is not reported.
+
+Usage:
+    drivers = prepare_fleet(payload["drivers"])   # raises LogFormatError on bad input
+    for violation in validate_fleet(drivers):
+        ...
+"""
+
+from __future__ import annotations
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Dict, Iterable, Iterator, List
+
+from .hos import (
+    BREAK_AFTER_DRIVING,
+    BREAK_DURATION,
+    CYCLE_DAYS,
+    CYCLE_MAX,
+    DAILY_DRIVE_MAX,
+    DAILY_DUTY_MAX,
+    OFF_DUTY_MIN,
+    RESTART_HOURS,
+)
+
+OFF, SB, DR, ON = 0, 1, 2, 3
+STATUS_CODES = {"off_duty": OFF, "sleeper_berth": SB, "driving": DR, "on_duty_not_driving": ON}
+TOLERANCE = 0.05  # logged hours are rounded to 0.01h, so sums of a few segments drift by a few hundredths
+
+RULES = ("11h_driving", "14h_window", "30min_break", "70h_8day")
+
+
+class LogFormatError(ValueError):
+    pass
+
+
+class DriverLogs:
+    """One driver's logs flattened into parallel columns, in clock order."""
+
+    __slots__ = ("driver_id", "cycle_used_before", "status", "hours", "day", "seg")
+
+    def __init__(self, driver_id, cycle_used_before: float = 0.0):
+        self.driver_id = driver_id
+        self.cycle_used_before = float(cycle_used_before)
+        self.status: List[int] = []
+        self.hours: List[float] = []
+        self.day: List[int] = []   # day number of each segment
+        self.seg: List[int] = []   # index of the segment within its day
+
+
+def _prepare_driver(entry: dict, position: int) -> DriverLogs:
+    where = f"drivers[{position}]"
+    if not isinstance(entry, dict):
+        raise LogFormatError(f"{where}: expected an object")
+    logs = entry.get("logs")
+    if not isinstance(logs, list):
+        raise LogFormatError(f"{where}.logs: expected a list of days")
+    try:
+        before = float(entry.get("cycle_used_before") or 0.0)
+    except (TypeError, ValueError):
+        raise LogFormatError(f"{where}.cycle_used_before: expected a number")
+
+    out = DriverLogs(entry.get("driver_id", position), before)
+    days = []
+    for i, d in enumerate(logs):
+        if not isinstance(d, dict) or not isinstance(d.get("day"), int) or not isinstance(d.get("segments"), list):
+            raise LogFormatError(f"{where}.logs[{i}]: expected {{\"day\": int, \"segments\": [...]}}")
+        days.append(d)
+    days.sort(key=lambda d: d["day"])
+
+    for d in days:
+        for k, s in enumerate(d["segments"]):
+            code = STATUS_CODES.get(s.get("status")) if isinstance(s, dict) else None
+            if code is None:
+                raise LogFormatError(f"{where} day {d['day']} segment {k}: unknown status")
+            try:
+                h = float(s.get("hours"))
+            except (TypeError, ValueError):
+                raise LogFormatError(f"{where} day {d['day']} segment {k}: hours must be a number")
+            if h < 0:
+                raise LogFormatError(f"{where} day {d['day']} segment {k}: hours must be >= 0")
+            out.status.append(code)
+            out.hours.append(h)
+            out.day.append(d["day"])
+            out.seg.append(k)
+    return out
+
+
+def prepare_fleet(drivers: Iterable[dict]) -> List[DriverLogs]:
+    """Validate the input shape up front (so errors surface before any results stream)."""
+    return [_prepare_driver(entry, i) for i, entry in enumerate(drivers)]
+
+
+def _violation(d: DriverLogs, i: int, rule: str, value: float, limit: float) -> Dict:
+    return {
+        "driver_id": d.driver_id,
+        "rule": rule,
+        "day": d.day[i],
+        "segment": d.seg[i],
+        "value": round(value, 2),
+        "limit": limit,
+    }
+
+
+def validate_driver(d: DriverLogs) -> Iterator[Dict]:
+    """Yield one violation per (driving segment, rule) that breaks the rule."""
+    n = len(d.hours)
+    if not n:
+        return
+
+    # Running sums at the END of each segment
+    drive_cum = list(accumulate(h if s == DR else 0.0 for s, h in zip(d.status, d.hours)))
+    duty_cum = list(accumulate(h if s in (DR, ON) else 0.0 for s, h in zip(d.status, d.hours)))
+    clock = list(accumulate(d.hours))
+
+    # On-duty total before the first segment of each day, for the 8-day window
+    day_numbers: List[int] = []
+    duty_before_day: List[float] = []
+    for i in range(n):
+        if not day_numbers or d.day[i] != day_numbers[-1]:
+            day_numbers.append(d.day[i])
+            duty_before_day.append(duty_cum[i - 1] if i else 0.0)
+    first_day = day_numbers[0]
+
+    shift_drive_ref = 0.0      # drive_cum at the last 10h rest
+    shift_start = None         # clock at first on-duty hour of the current shift
+    break_drive_ref = 0.0      # drive_cum at the last qualifying break
+    restart_duty_ref = 0.0     # duty_cum at the last 34h restart
+    prior = d.cycle_used_before
+    rest_run = 0.0             # consecutive off-duty / sleeper hours
+    non_drive_run = 0.0        # consecutive non-driving hours
+
+    for i in range(n):
+        s, h = d.status[i], d.hours[i]
+        start = clock[i] - h
+
+        if s in (OFF, SB):
+            rest_run += h
+            non_drive_run += h
+            if rest_run >= OFF_DUTY_MIN - TOLERANCE:
+                shift_drive_ref = drive_cum[i]
+                shift_start = None
+            if rest_run >= RESTART_HOURS - TOLERANCE:
+                restart_duty_ref = duty_cum[i]
+                prior = 0.0
+            if non_drive_run >= BREAK_DURATION - TOLERANCE:
+                break_drive_ref = drive_cum[i]
+            continue
+
+        if h <= 0:
+            continue
+        if shift_start is None:
+            shift_start = start
+        rest_run = 0.0
+
+        if s == ON:
+            non_drive_run += h
+            if non_drive_run >= BREAK_DURATION - TOLERANCE:
+                break_drive_ref = drive_cum[i]
+            continue
+
+        # --- driving segment: check every rule at its end ---------------------
+        non_drive_run = 0.0
+
+        driven = drive_cum[i] - shift_drive_ref
+        if driven > DAILY_DRIVE_MAX + TOLERANCE:
+            yield _violation(d, i, "11h_driving", driven, DAILY_DRIVE_MAX)
+
+        window = clock[i] - shift_start
+        if window > DAILY_DUTY_MAX + TOLERANCE:
+            yield _violation(d, i, "14h_window", window, DAILY_DUTY_MAX)
+
+        since_break = drive_cum[i] - break_drive_ref
+        if since_break > BREAK_AFTER_DRIVING + TOLERANCE:
+            yield _violation(d, i, "30min_break", since_break, BREAK_AFTER_DRIVING)
+
+        window_first_day = d.day[i] - (CYCLE_DAYS - 1)
+        k = bisect_left(day_numbers, window_first_day)
+        on_duty = duty_cum[i] - max(duty_before_day[k], restart_duty_ref)
+        if window_first_day < first_day:
+            on_duty += prior
+        if on_duty > CYCLE_MAX + TOLERANCE:
+            yield _violation(d, i, "70h_8day", on_duty, CYCLE_MAX)
+
+
+def validate_fleet(drivers: Iterable[DriverLogs]) -> Iterator[Dict]:
+    for d in drivers:
+        yield from validate_driver(d)
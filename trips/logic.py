@@ -5,6 +5,12 @@ import math
 
 LonLat = Tuple[float, float]  # [lon, lat]
 
+# Straight-line -> road distance factor and average truck speed, for estimates
+# when no routed geometry is available (see estimate_route).
+ROAD_CIRCUITY = 1.2
+AVG_TRUCK_MPH = 55.0
+METERS_PER_MILE = 1609.344
+
 # --- geometry helpers ---------------------------------------------------------
 
 def _haversine_miles(p1: LonLat, p2: LonLat) -> float:
@@ -41,6 +47,16 @@ def _interp_on_segment(a: LonLat, b: LonLat, t: float) -> LonLat:
     bx, by = b
     return (ax + (bx - ax) * t, ay + (by - ay) * t)
 
+
+def _cumulative_miles(pts: Sequence[LonLat]) -> List[float]:
+    """
+    Running distance (miles) at each vertex of a polyline; cum[0] == 0.
+    """
+    cum = [0.0]
+    for i in range(len(pts) - 1):
+        cum.append(cum[-1] + max(_segment_distance_miles(pts[i], pts[i + 1]), 0.0))
+    return cum
+
 # --- public API ----------------------------------------------------------------
 
 def compute_fuel_stops_along_line(
@@ -74,14 +90,8 @@ def compute_fuel_stops_along_line(
       return []
 
     # Precompute cumulative distances along the line
-    seg_len = []
-    for i in range(len(pts) - 1):
-        d = _segment_distance_miles(pts[i], pts[i + 1])
-        seg_len.append(max(d, 0.0))
-
-    cum = [0.0]
-    for d in seg_len:
-        cum.append(cum[-1] + d)
+    cum = _cumulative_miles(pts)
+    seg_count = len(pts) - 1
     total_len = cum[-1]
     if total_len <= 0:
         return []
@@ -96,7 +106,7 @@ def compute_fuel_stops_along_line(
     seg_index = 0
     for target in targets:
         # advance seg_index until cum[seg_index+1] >= target
-        while seg_index < len(seg_len) - 1 and cum[seg_index + 1] < target:
+        while seg_index < seg_count - 1 and cum[seg_index + 1] < target:
             seg_index += 1
 
         # segment [seg_index] is where target falls
@@ -113,3 +123,112 @@ def compute_fuel_stops_along_line(
         fuel_points.append(p)
 
     return fuel_points
+
+
+def line_length_miles(line_coords: Sequence[LonLat]) -> float:
+    """
+    Total great-circle length of a polyline in miles.
+    """
+    pts = list(line_coords or [])
+    return _cumulative_miles(pts)[-1] if pts else 0.0
+
+
+def project_onto_line(
+    line_coords: Sequence[LonLat],
+    point: LonLat,
+    start_miles: float = 0.0,
+    end_miles: float | None = None,
+) -> Tuple[float, float, int, LonLat]:
+    """
+    Snap `point` to the closest position on a routed polyline.
+
+    Returns (miles_along, miles_off_line, segment_index, snapped_point):
+        miles_along:    distance from the start of the line to the snapped point.
+        miles_off_line: great-circle distance from `point` to the snapped point.
+        segment_index:  index i of the segment [i, i+1] holding the snapped point.
+
+    Only the part of the line between `start_miles` and `end_miles` (from the
+    start of the line) is searched. A route that doubles back passes the same
+    place twice, and the position alone can't tell the passes apart: callers
+    that know which leg the driver is on (before / after the pickup) say so.
+
+    Candidate segments are compared in a local equirectangular plane (fine at
+    road-segment scale); only the winner is measured with haversine.
+    """
+    pts = list(line_coords or [])
+    if not pts:
+        raise ValueError("project_onto_line: empty line")
+    if len(pts) == 1:
+        return 0.0, _haversine_miles(pts[0], point), 0, tuple(pts[0])  # type: ignore
+
+    cum = _cumulative_miles(pts)
+    lo = min(max(start_miles, 0.0), cum[-1])
+    hi = cum[-1] if end_miles is None else min(max(end_miles, lo), cum[-1])
+
+    px, py = point
+    kx = math.cos(math.radians(py))  # shrink longitude degrees to match latitude degrees
+    best = (math.inf, 0, 0.0)  # (planar dist^2, segment index, t)
+    for i in range(len(pts) - 1):
+        if cum[i + 1] < lo or cum[i] > hi:
+            continue
+        seg_miles = cum[i + 1] - cum[i]
+        t_lo = (lo - cum[i]) / seg_miles if seg_miles > 0 and lo > cum[i] else 0.0
+        t_hi = (hi - cum[i]) / seg_miles if seg_miles > 0 and hi < cum[i + 1] else 1.0
+        ax, ay = pts[i]
+        bx, by = pts[i + 1]
+        dx, dy = (bx - ax) * kx, by - ay
+        wx, wy = (px - ax) * kx, py - ay
+        seg2 = dx * dx + dy * dy
+        t = 0.0 if seg2 <= 0 else (wx * dx + wy * dy) / seg2
+        t = min(t_hi, max(t_lo, t))
+        ex, ey = wx - t * dx, wy - t * dy
+        d2 = ex * ex + ey * ey
+        if d2 < best[0]:
+            best = (d2, i, t)
+
+    _, i, t = best
+    snapped = _interp_on_segment(pts[i], pts[i + 1], t)
+    along = cum[i] + _haversine_miles(pts[i], snapped)
+    return along, _haversine_miles(point, snapped), i, snapped
+
+
+def line_from(line_coords: Sequence[LonLat], segment_index: int, start: LonLat) -> List[LonLat]:
+    """
+    Remainder of a polyline from `start` (a point on segment `segment_index`,
+    e.g. from project_onto_line) to the end.
+    """
+    return [tuple(start)] + [tuple(p) for p in list(line_coords)[segment_index + 1:]]  # type: ignore
+
+
+def estimate_route(
+    coords: Sequence[LonLat],
+    circuity: float = ROAD_CIRCUITY,
+    avg_mph: float = AVG_TRUCK_MPH,
+) -> dict:
+    """
+    Routing-free stand-in for ors.route(): great-circle legs scaled by a road
+    circuity factor, driven at an average truck speed. Same keys as ors.route()
+    (no instructions), plus "circuity" so callers can map road miles back onto
+    the straight-line geometry.
+    """
+    pts = [tuple(p) for p in coords or []]
+    if len(pts) < 2:
+        raise ValueError("estimate_route: need at least 2 coordinates [lon,lat]")
+
+    segments = []
+    for a, b in zip(pts, pts[1:]):
+        miles = _haversine_miles(a, b) * circuity
+        segments.append({
+            "distance": miles * METERS_PER_MILE,
+            "duration": miles / avg_mph * 3600.0,
+            "steps": [],
+        })
+    distance_miles = sum(s["distance"] for s in segments) / METERS_PER_MILE
+    return {
+        "line_coords": [list(p) for p in pts],
+        "distance_miles": distance_miles,
+        "duration_seconds": sum(s["duration"] for s in segments),
+        "segments": segments,
+        "instructions": [],
+        "circuity": circuity,
+    }
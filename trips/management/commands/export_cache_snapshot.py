@@ -0,0 +1,71 @@
+# trips/management/commands/export_cache_snapshot.py
+"""
+Export the hottest cache entries (geocodes, route legs) to a snapshot file that
+server/wsgi.py loads at startup:
+
+    python manage.py export_cache_snapshot
+    python manage.py export_cache_snapshot --limit 500 --namespace geocode --out /tmp/snap.jsonl.gz
+
+Needs the shared (sqlite) backend: a memory cache in this process is always
+empty. An existing snapshot is not replaced by an empty one unless --force.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from trips.cache import SNAPSHOT_NAMESPACES, MemoryCache, export_snapshot, get_cache
+
+
+class Command(BaseCommand):
+    help = "Export the most recently used geocodes and routes to a cache snapshot file."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--out",
+            default=getattr(settings, "TRIPS_CACHE_SNAPSHOT", ""),
+            help="Snapshot path (default: TRIPS_CACHE_SNAPSHOT).",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=1000,
+            help="Max entries per namespace (default: 1000).",
+        )
+        parser.add_argument(
+            "--namespace",
+            action="append",
+            dest="namespaces",
+            help=f"Namespace to export; repeatable (default: {', '.join(SNAPSHOT_NAMESPACES)}).",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Replace an existing snapshot even if the cache has nothing to export.",
+        )
+
+    def handle(self, *args, **opts):
+        out = opts["out"]
+        if not out:
+            raise CommandError("No output path: pass --out or set TRIPS_CACHE_SNAPSHOT.")
+        if opts["limit"] <= 0:
+            raise CommandError("--limit must be positive.")
+
+        cache = get_cache()
+        if isinstance(cache, MemoryCache):
+            raise CommandError(
+                "The cache is a per-process memory cache (TRIPS_CACHE_BACKEND=memory, or the SQLite "
+                "file could not be opened); it is empty in manage.py, so there is nothing to export."
+            )
+        namespaces = opts["namespaces"] or SNAPSHOT_NAMESPACES
+        stats = cache.stats()
+        if os.path.exists(out) and not opts["force"] and not any(
+            stats.get(ns, {}).get("entries") for ns in namespaces
+        ):
+            raise CommandError(f"No cache entries to export; keeping {out} (pass --force to replace it).")
+
+        written = export_snapshot(cache, out, namespaces=namespaces, limit=opts["limit"])
+        for ns, n in written.items():
+            self.stdout.write(f"{ns}: {n} entries")
+        self.stdout.write(self.style.SUCCESS(f"Wrote snapshot to {out}"))
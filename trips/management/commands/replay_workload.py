@@ -0,0 +1,313 @@
+# trips/management/commands/replay_workload.py
+"""
+Replay a JSONL workload of trip requests against the planner and report
+throughput, latency percentiles, error rate and a per-stage breakdown.
+Plans answered on time but on an estimated route ("degraded": true, e.g. when
+the stub injects routing failures) are counted separately from errors.
+
+Each workload line is a POST /api/trips/ body:
+    {"current_location": "Kansas City, MO", "pickup_location": "Chicago, IL",
+     "dropoff_location": "Dallas, TX", "current_cycle_used": 20}
+
+By default requests go through the Django app in-process and ORS is replaced
+by a local stub (trips/ors_stub.py):
+
+    python manage.py replay_workload workload.jsonl --concurrency 4 --rate 20 \\
+        --stub-latency-ms 300 --stub-error-rate 0.01
+
+To load-test a running server (e.g. gunicorn), start the stub on a fixed port,
+run the server with ORS_BASE_URL pointing at it, and pass --target:
+
+    python manage.py replay_workload workload.jsonl --stub-port 8765 \\
+        --target http://127.0.0.1:8000
+
+In-process runs use a throwaway database and a private in-memory cache, so
+they always start cold (use --repeat for warm passes) and the stub's fake
+geocodes and routes never reach db.sqlite3 or the shared TRIPS_CACHE_PATH file.
+
+A --target server writes whatever the stub returns into ITS cache and
+database. On the same host that is the shared TRIPS_CACHE_PATH file production
+workers read (entries have no TTL), so run the target with its own
+TRIPS_CACHE_PATH and database.
+
+Latency is measured from each request's scheduled arrival time, so a saturated
+server shows up as queueing delay instead of a silently lower arrival rate.
+"""
+
+from __future__ import annotations
+import json
+import logging
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, List
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+
+from trips import cache as trips_cache
+from trips import ors
+from trips.cache import MemoryCache, get_cache
+from trips.ors_stub import ORSStub
+
+PLAN_PATH = "/api/trips/"
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _parse_server_timing(header: str) -> Dict[str, float]:
+    stages = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        for p in params.split(";"):
+            key, _, val = p.strip().partition("=")
+            if name and key == "dur":
+                try:
+                    stages[name] = float(val)
+                except ValueError:
+                    pass
+    return stages
+
+
+def _is_degraded(content: bytes) -> bool:
+    try:
+        body = json.loads(content)
+    except ValueError:
+        return False
+    return isinstance(body, dict) and body.get("degraded") is True
+
+
+class Command(BaseCommand):
+    help = "Replay a JSONL workload of trip requests and report latency/throughput."
+
+    def add_arguments(self, parser):
+        parser.add_argument("workload", help="JSONL file, one POST /api/trips/ body per line.")
+        parser.add_argument("--concurrency", type=int, default=4, help="Concurrent clients (default: 4).")
+        parser.add_argument(
+            "--rate", type=float, default=0.0,
+            help="Arrival rate in requests/second; 0 = as fast as the clients allow (default: 0).",
+        )
+        parser.add_argument("--poisson", action="store_true", help="Exponential inter-arrival times instead of fixed.")
+        parser.add_argument("--repeat", type=int, default=1, help="Passes over the workload (default: 1).")
+        parser.add_argument("--target", default="", help="Base URL of a running server; default is in-process.")
+        parser.add_argument("--timeout", type=float, default=90.0, help="Per-request timeout for --target (s).")
+        parser.add_argument("--no-stub", action="store_true", help="Do not start the ORS stub (use the real ORS).")
+        parser.add_argument("--stub-port", type=int, default=0, help="Stub port (default: random free port).")
+        parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Stub mean latency per call.")
+        parser.add_argument("--stub-jitter-ms", type=float, default=0.0, help="Stub uniform latency jitter (+/-).")
+        parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Fraction of stub calls that fail.")
+        parser.add_argument("--stub-error-status", type=int, default=503, help="HTTP status for injected failures.")
+        parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    # --- workload ------------------------------------------------------------
+
+    def _load(self, path: str) -> List[dict]:
+        if not os.path.exists(path):
+            raise CommandError(f"Workload not found: {path}")
+        bodies = []
+        with open(path, encoding="utf-8") as fh:
+            for lineno, line in enumerate(fh, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as exc:
+                    self.stderr.write(f"{path}:{lineno}: skipped ({exc})")
+                    continue
+                if isinstance(item, dict):
+                    bodies.append(item)
+        if not bodies:
+            raise CommandError(f"No trip requests in {path}")
+        return bodies
+
+    def _schedule(self, n: int, rate: float, poisson: bool) -> List[float]:
+        if rate <= 0:
+            return [0.0] * n
+        t, offsets = 0.0, []
+        for _ in range(n):
+            offsets.append(t)
+            t += random.expovariate(rate) if poisson else 1.0 / rate
+        return offsets
+
+    # --- senders -------------------------------------------------------------
+
+    def _in_process_sender(self):
+        local = threading.local()
+        hosts = [h for h in settings.ALLOWED_HOSTS if h and h != "*" and not h.startswith(".")]
+        host = hosts[0] if hosts else "localhost"
+
+        # failed plans are counted in the report; don't dump a traceback per request
+        logging.getLogger("django.request").setLevel(logging.CRITICAL)
+
+        def send(body):
+            client = getattr(local, "client", None)
+            if client is None:
+                client = local.client = Client(raise_request_exception=False, HTTP_HOST=host)
+            resp = client.post(PLAN_PATH, data=json.dumps(body), content_type="application/json")
+            return resp.status_code, resp.headers.get("Server-Timing", ""), _is_degraded(resp.content)
+
+        return send
+
+    def _http_sender(self, target: str, timeout: float):
+        local = threading.local()
+        url = target.rstrip("/") + PLAN_PATH
+
+        def send(body):
+            session = getattr(local, "session", None)
+            if session is None:
+                session = local.session = requests.Session()
+            try:
+                resp = session.post(url, json=body, timeout=timeout)
+            except requests.RequestException:
+                return 0, "", False
+            return resp.status_code, resp.headers.get("Server-Timing", ""), _is_degraded(resp.content)
+
+        return send
+
+    # --- main ----------------------------------------------------------------
+
+    def handle(self, *args, **opts):
+        if opts["concurrency"] <= 0 or opts["repeat"] <= 0:
+            raise CommandError("--concurrency and --repeat must be positive.")
+
+        bodies = self._load(opts["workload"]) * opts["repeat"]
+        offsets = self._schedule(len(bodies), opts["rate"], opts["poisson"])
+        in_process = not opts["target"]
+        if in_process:
+            with self._isolated():
+                self._run(bodies, offsets, in_process, opts)
+        else:
+            self._run(bodies, offsets, in_process, opts)
+
+    @contextmanager
+    def _isolated(self):
+        """Throwaway migrated database + private MemoryCache for an in-process run."""
+        old_cache = trips_cache._cache
+        old_name = connection.settings_dict["NAME"]
+        with tempfile.TemporaryDirectory(prefix="replay-") as tmp:
+            if connection.vendor == "sqlite":
+                # a file, not the default shared-cache :memory: DB, so client threads don't hit table locks
+                connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(tmp, "replay.sqlite3")
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            trips_cache._cache = MemoryCache(max_bytes=settings.TRIPS_CACHE_MAX_BYTES)
+            try:
+                yield
+            finally:
+                trips_cache._cache = old_cache
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _run(self, bodies: List[dict], offsets: List[float], in_process: bool, opts):
+        stub = None
+        if not opts["no_stub"]:
+            stub = ORSStub(
+                port=opts["stub_port"],
+                latency_ms=opts["stub_latency_ms"],
+                jitter_ms=opts["stub_jitter_ms"],
+                error_rate=opts["stub_error_rate"],
+                error_status=opts["stub_error_status"],
+            ).start()
+            self.stderr.write(f"ORS stub listening on {stub.url}")
+            if in_process:
+                ors.ORS_BASE = stub.url
+                os.environ.setdefault("ORS_API_KEY", "stub")
+            else:
+                self.stderr.write(f"(the target server must run with ORS_BASE_URL={stub.url})")
+
+        send = self._in_process_sender() if in_process else self._http_sender(opts["target"], opts["timeout"])
+        results = []
+        results_lock = threading.Lock()
+        start = time.perf_counter()
+
+        def run(i):
+            wait = start + offsets[i] - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            status, timing, degraded = send(bodies[i])
+            latency_ms = (time.perf_counter() - (start + offsets[i])) * 1000.0
+            with results_lock:
+                results.append((status, latency_ms, _parse_server_timing(timing), degraded))
+
+        try:
+            with ThreadPoolExecutor(max_workers=opts["concurrency"]) as pool:
+                list(pool.map(run, range(len(bodies))))
+        finally:
+            if stub is not None:
+                stub.stop()
+        elapsed = time.perf_counter() - start
+
+        report = self._report(results, elapsed, stub, get_cache().stats() if in_process else None)
+        if opts["json"]:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self._print(report)
+
+    def _report(self, results, elapsed: float, stub, cache_stats) -> dict:
+        latencies = sorted(r[1] for r in results)
+        errors = sum(1 for r in results if not 200 <= r[0] < 300)
+        degraded = sum(1 for r in results if r[3])
+        statuses: Dict[str, int] = {}
+        stage_samples: Dict[str, List[float]] = {}
+        for status, _, stages, _ in results:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+            for name, ms in stages.items():
+                stage_samples.setdefault(name, []).append(ms)
+
+        stages = {}
+        for name, samples in stage_samples.items():
+            samples.sort()
+            stages[name] = {
+                "mean_ms": round(sum(samples) / len(samples), 2),
+                "p95_ms": round(_percentile(samples, 95), 2),
+            }
+
+        report = {
+            "requests": len(results),
+            "elapsed_s": round(elapsed, 3),
+            "throughput_rps": round(len(results) / elapsed, 2) if elapsed > 0 else 0.0,
+            "latency_ms": {
+                "p50": round(_percentile(latencies, 50), 2),
+                "p95": round(_percentile(latencies, 95), 2),
+                "p99": round(_percentile(latencies, 99), 2),
+                "max": round(latencies[-1], 2) if latencies else 0.0,
+            },
+            "error_rate": round(errors / len(results), 4) if results else 0.0,
+            "degraded": degraded,
+            "degraded_rate": round(degraded / len(results), 4) if results else 0.0,
+            "statuses": statuses,
+            "stages": stages,
+        }
+        if stub is not None:
+            report["ors_calls"] = stub.calls
+        if cache_stats is not None:
+            report["cache"] = cache_stats
+        return report
+
+    def _print(self, report: dict):
+        lat = report["latency_ms"]
+        self.stdout.write(
+            f"{report['requests']} requests in {report['elapsed_s']}s "
+            f"({report['throughput_rps']} req/s), error rate {report['error_rate']:.2%}, "
+            f"degraded {report['degraded']} ({report['degraded_rate']:.2%})"
+        )
+        self.stdout.write(f"latency ms: p50={lat['p50']} p95={lat['p95']} p99={lat['p99']} max={lat['max']}")
+        self.stdout.write("statuses: " + ", ".join(f"{k}={v}" for k, v in sorted(report["statuses"].items())))
+        for name, s in report["stages"].items():
+            self.stdout.write(f"  {name:<8} mean={s['mean_ms']}ms p95={s['p95_ms']}ms")
+        if "ors_calls" in report:
+            self.stdout.write(f"ORS stub calls: {report['ors_calls']}")
+        for ns, s in report.get("cache", {}).items():
+            self.stdout.write(f"cache {ns}: hit_rate={s['hit_rate']:.2%} entries={s['entries']}")
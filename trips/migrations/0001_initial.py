@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TripPlan',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inputs', models.JSONField()),
+                ('waypoints', models.JSONField(help_text='{"current": [lon, lat], "pickup": [...], "dropoff": [...]}')),
+                ('line_coords', models.JSONField(help_text='Route LineString coordinates [[lon, lat], ...].')),
+                ('distance_miles', models.FloatField()),
+                ('duration_seconds', models.FloatField()),
+                ('pickup_miles', models.FloatField(blank=True, null=True)),
+                ('instructions', models.JSONField(blank=True, default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('parent', models.ForeignKey(blank=True, help_text='Plan this one was re-planned from.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='replans', to='trips.tripplan')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
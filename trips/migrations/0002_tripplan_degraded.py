@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tripplan',
+            name='degraded',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0002_tripplan_degraded'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tripplan',
+            name='refining',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,32 @@
+import uuid
+
+from django.db import migrations, models
+
+
+def gen_public_ids(apps, schema_editor):
+    TripPlan = apps.get_model("trips", "TripPlan")
+    for plan in TripPlan.objects.only("pk").iterator():
+        plan.public_id = uuid.uuid4()
+        plan.save(update_fields=["public_id"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trips', '0003_tripplan_refining'),
+    ]
+
+    operations = [
+        # nullable first, so existing rows don't all get the same default UUID
+        migrations.AddField(
+            model_name='tripplan',
+            name='public_id',
+            field=models.UUIDField(null=True, editable=False),
+        ),
+        migrations.RunPython(gen_public_ids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='tripplan',
+            name='public_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
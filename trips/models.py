@@ -1,3 +1,37 @@
+import uuid
+
 from django.db import models
 
-# Create your models here.
+
+class TripPlan(models.Model):
+    """
+    A planned trip, kept so an in-progress trip can be re-planned from the
+    stored route instead of geocoding and routing it again.
+    """
+    # The ID clients see (plan_id in responses and URLs): not guessable, unlike pk.
+    public_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    parent = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.SET_NULL, related_name="replans",
+        help_text="Plan this one was re-planned from.",
+    )
+    inputs = models.JSONField()
+    waypoints = models.JSONField(help_text='{"current": [lon, lat], "pickup": [...], "dropoff": [...]}')
+    line_coords = models.JSONField(help_text="Route LineString coordinates [[lon, lat], ...].")
+    distance_miles = models.FloatField()
+    duration_seconds = models.FloatField()
+    # Road miles from the start of the route to the pickup; null once picked up.
+    pickup_miles = models.FloatField(null=True, blank=True)
+    instructions = models.JSONField(default=list, blank=True)
+    # True while the route is a straight-line estimate (ORS missed the planning
+    # budget); cleared when the routed geometry arrives in the background.
+    degraded = models.BooleanField(default=False)
+    # True while that background route is still on its way. A degraded plan
+    # that is no longer refining stays an estimate (ORS failed or was saturated).
+    refining = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"TripPlan #{self.pk} ({self.distance_miles:.0f} mi)"
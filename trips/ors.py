@@ -18,7 +18,9 @@ OpenRouteService helpers:
 
 Notes:
 - Uses the ORS "driving-hgv" profile (truck) to match property-carrying assumptions.
-- Requires ORS_API_KEY in environment.
+- Requires ORS_API_KEY in environment; ORS_BASE_URL overrides the API host.
+- Successful geocodes and routes are stored in the shared cache tier (trips.cache),
+  under the "geocode" and "route" namespaces.
 """
 
 from __future__ import annotations
@@ -26,9 +28,15 @@ import os
 import requests
 from typing import List, Dict, Any, Sequence, Tuple
 
+from .cache import get_cache
+from .deadline import Deadline, DeadlineExceeded
+
 LonLat = Tuple[float, float]
-ORS_BASE = "https://api.openrouteservice.org"
+# Overridable so load tests can point at a local stand-in (see trips/ors_stub.py)
+ORS_BASE = os.environ.get("ORS_BASE_URL", "https://api.openrouteservice.org").rstrip("/")
 PROFILE = "driving-hgv"  # truck routing profile
+GEOCODE_TIMEOUT = 20  # seconds
+ROUTE_TIMEOUT = 60
 
 
 class ORSError(RuntimeError):
@@ -42,17 +50,52 @@ def _api_key() -> str:
     return key
 
 
-def geocode(query: str) -> LonLat:
+def _geocode_key(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def _route_key(pts: Sequence[LonLat]) -> str:
+    # ~1 m precision: geocodes of the same place always hit the same key
+    return ";".join(f"{float(x):.5f},{float(y):.5f}" for (x, y) in pts)
+
+
+def cached_geocode(query: str) -> LonLat | None:
+    """The cached geocode for `query`, or None; never calls ORS."""
+    hit = get_cache().get("geocode", _geocode_key(query))
+    return (float(hit[0]), float(hit[1])) if hit is not None else None
+
+
+def cached_route(coords: Sequence[LonLat]) -> Dict[str, Any] | None:
+    """The cached route through `coords`, or None; never calls ORS."""
+    return get_cache().get("route", _route_key(list(coords or [])))
+
+
+def geocode(query: str, deadline: Deadline | None = None, *, check_cache: bool = True) -> LonLat:
     """
     Simple forward geocode via ORS Geocoding.
     Returns [lon, lat].
+    With a `deadline`, the HTTP timeout is capped by the remaining budget and
+    DeadlineExceeded is raised once it runs out (cache hits are always served).
+    check_cache=False skips the cache read, for callers that already missed via
+    cached_geocode(); the result is still stored.
     """
     if not query:
         raise ValueError("geocode: query is required")
 
+    if check_cache:
+        hit = cached_geocode(query)
+        if hit is not None:
+            return hit
+
     url = f"{ORS_BASE}/geocode/search"
     params = {"api_key": _api_key(), "text": query, "size": 1}
-    r = requests.get(url, params=params, timeout=20)
+    timeout = deadline.timeout(GEOCODE_TIMEOUT) if deadline else GEOCODE_TIMEOUT
+    try:
+        r = requests.get(url, params=params, timeout=timeout)
+    except requests.Timeout as exc:
+        if deadline is not None and timeout < GEOCODE_TIMEOUT:
+            raise DeadlineExceeded(f"Geocode for {query!r} did not finish within the planning budget") from exc
+        raise
     if r.status_code != 200:
         raise ORSError(f"Geocode failed: {r.status_code} {r.text[:200]}")
     data = r.json()
@@ -60,18 +103,26 @@ def geocode(query: str) -> LonLat:
     if not feats:
         raise ORSError(f"Geocode had no results for: {query}")
     coords = feats[0]["geometry"]["coordinates"]  # [lon, lat]
-    return (float(coords[0]), float(coords[1]))
+    result = (float(coords[0]), float(coords[1]))
+    get_cache().set("geocode", _geocode_key(query), list(result))
+    return result
 
 
-def route(coords: Sequence[LonLat]) -> Dict[str, Any]:
+def route(coords: Sequence[LonLat], *, check_cache: bool = True) -> Dict[str, Any]:
     """
     Request a truck route (driving-hgv) with step-by-step instructions.
     coords: list of [lon, lat] points (at least 2).
+    check_cache=False skips the cache read (see geocode()).
     """
     pts = list(coords or [])
     if len(pts) < 2:
         raise ValueError("route: need at least 2 coordinates [lon,lat]")
 
+    if check_cache:
+        hit = cached_route(pts)
+        if hit is not None:
+            return hit
+
     url = f"{ORS_BASE}/v2/directions/{PROFILE}/geojson"
     headers = {"Authorization": _api_key(), "Content-Type": "application/json"}
     body = {
@@ -82,7 +133,7 @@ def route(coords: Sequence[LonLat]) -> Dict[str, Any]:
         # optional: avoid restrictions if desired; keep defaults for now
     }
 
-    r = requests.post(url, json=body, headers=headers, timeout=60)
+    r = requests.post(url, json=body, headers=headers, timeout=ROUTE_TIMEOUT)
     if r.status_code != 200:
         raise ORSError(f"Route failed: {r.status_code} {r.text[:400]}")
     data = r.json()
@@ -130,10 +181,12 @@ def route(coords: Sequence[LonLat]) -> Dict[str, Any]:
                 "type": s.get("type"),
             })
 
-    return {
+    result = {
         "line_coords": line_coords,
         "distance_miles": distance_miles,
         "duration_seconds": duration_seconds,
         "segments": segments,
         "instructions": instructions,  # frontend RouteInstructions can consume this directly
     }
+    get_cache().set("route", _route_key(pts), result)
+    return result
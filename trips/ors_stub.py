@@ -0,0 +1,177 @@
+# trips/ors_stub.py
+"""
+Local OpenRouteService stand-in for load tests (see `manage.py replay_workload`).
+
+Serves the two endpoints trips.ors uses:
+- GET  /geocode/search?text=...            -> deterministic point inside the lower 48
+- POST /v2/directions/<profile>/geojson    -> straight-line route through the coordinates
+
+Routes are densified to one vertex every ~10 straight-line miles, with road
+distance = straight-line distance * ROAD_CIRCUITY and duration at AVG_TRUCK_MPH, so
+the planner downstream (fuel stops, HOS) sees realistic magnitudes.
+
+Latency and failures are configurable:
+    stub = ORSStub(latency_ms=150, jitter_ms=50, error_rate=0.02).start()
+    ...  # point trips.ors at stub.url
+    stub.stop()
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+from urllib.parse import parse_qs, urlparse
+
+from .logic import (
+    AVG_TRUCK_MPH,
+    METERS_PER_MILE,
+    ROAD_CIRCUITY,
+    LonLat,
+    _haversine_miles,
+    _interp_on_segment,
+)
+
+VERTEX_EVERY_MILES = 10.0
+
+
+def fake_geocode(text: str) -> LonLat:
+    """Stable pseudo-location for a query: same text, same point."""
+    digest = hashlib.sha256(" ".join(text.lower().split()).encode("utf-8")).digest()
+    u = int.from_bytes(digest[:4], "big") / 2**32
+    v = int.from_bytes(digest[4:8], "big") / 2**32
+    return (round(-122.0 + u * 46.0, 6), round(30.0 + v * 17.0, 6))
+
+
+def fake_route(coords: List[LonLat]) -> dict:
+    line: List[List[float]] = [list(coords[0])]
+    segments = []
+    total_m = total_s = 0.0
+    for a, b in zip(coords, coords[1:]):
+        straight = _haversine_miles(a, b)
+        n = max(1, int(straight // VERTEX_EVERY_MILES))
+        for i in range(1, n + 1):
+            line.append(list(_interp_on_segment(a, b, i / n)))
+        meters = straight * ROAD_CIRCUITY * METERS_PER_MILE
+        seconds = straight * ROAD_CIRCUITY / AVG_TRUCK_MPH * 3600.0
+        total_m += meters
+        total_s += seconds
+        segments.append({
+            "distance": meters,
+            "duration": seconds,
+            "steps": [{"distance": meters, "duration": seconds, "instruction": "Continue", "name": "-", "type": 6}],
+        })
+    return {
+        "type": "FeatureCollection",
+        "features": [{
+            "type": "Feature",
+            "geometry": {"type": "LineString", "coordinates": line},
+            "properties": {"summary": {"distance": total_m, "duration": total_s}, "segments": segments},
+        }],
+    }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "_Server"
+
+    def log_message(self, fmt, *args):  # keep load-test output clean
+        pass
+
+    def _send(self, code: int, payload: dict):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self) -> bool:
+        """Apply latency + error injection. Returns False if an error was sent."""
+        stub = self.server.stub
+        stub.record_call()
+        delay = stub.latency_ms + random.uniform(-stub.jitter_ms, stub.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+        if stub.error_rate > 0 and random.random() < stub.error_rate:
+            self._send(stub.error_status, {"error": {"code": stub.error_status, "message": "injected failure"}})
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/geocode/search":
+            return self._send(404, {"error": "not found"})
+        if not self._simulate():
+            return
+        text = (parse_qs(url.query).get("text") or [""])[0]
+        lon, lat = fake_geocode(text)
+        self._send(200, {"features": [{"geometry": {"type": "Point", "coordinates": [lon, lat]}}]})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if not (url.path.startswith("/v2/directions/") and url.path.endswith("/geojson")):
+            return self._send(404, {"error": "not found"})
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        if not self._simulate():
+            return
+        coords = [tuple(c) for c in body.get("coordinates") or []]
+        if len(coords) < 2:
+            return self._send(400, {"error": "need at least 2 coordinates"})
+        self._send(200, fake_route(coords))
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    stub: "ORSStub"
+
+    def handle_error(self, request, client_address):
+        # clients that gave up on a slow call (planning budget) are expected, not errors
+        if isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class ORSStub:
+    """Threaded HTTP stand-in for ORS with configurable latency and error injection."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+    ):
+        self.latency_ms = float(latency_ms)
+        self.jitter_ms = float(jitter_ms)
+        self.error_rate = float(error_rate)
+        self.error_status = int(error_status)
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._httpd = _Server((host, port), _Handler)
+        self._httpd.stub = self
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def record_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def start(self) -> "ORSStub":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="ors-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,163 @@
+# trips/profiling.py
+"""
+Opt-in per-request profiling.
+
+When TRIPS_PROFILING is off (the default) ProfilingMiddleware removes itself at
+startup (MiddlewareNotUsed), so it costs nothing per request.
+
+When on, a request is profiled if any of these hold:
+- header  `X-Profile: <TRIPS_PROFILE_TOKEN>`   (token must be set and match)
+- query   `?profile=1` (or `?profile=sample`) from a logged-in staff user
+- random  sampling at TRIPS_PROFILE_SAMPLE_RATE (0.0 - 1.0)
+
+Artifacts go to TRIPS_PROFILE_DIR (oldest deleted beyond TRIPS_PROFILE_MAX_FILES),
+and the artifact ID is returned in the `X-Profile-Id` response header:
+- mode "cprofile": <id>.pstats   -> python -m pstats, snakeviz, gprof2dot
+- mode "sample":   <id>.folded   -> collapsed stacks for flamegraph.pl / speedscope
+
+Only one request per process is profiled at a time; others run unprofiled.
+
+Blind spots:
+- StreamingHttpResponse views (e.g. /api/hos/validate/) are profiled only up
+  to returning the response; the body is generated later, while the server
+  iterates it, outside the profiler.
+- Work handed to other threads is not captured: cProfile and the sampler
+  both follow the request thread only, so the geocode and route stages,
+  which run on the "ors-geocode" and "ors-route" pool threads
+  (trips.views._geocode_all, _route_within), show up as time spent waiting
+  on futures.
+"""
+
+from __future__ import annotations
+import cProfile
+import hmac
+import logging
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+logger = logging.getLogger(__name__)
+
+MODES = ("cprofile", "sample")
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+
+
+class StackSampler:
+    """Samples one thread's Python stack on a background thread into collapsed-stack counts."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as fh:
+            for stack, n in self.counts.most_common():
+                fh.write(f"{stack} {n}\n")
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "TRIPS_PROFILING", False):
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.directory = str(settings.TRIPS_PROFILE_DIR)
+        self.max_files = int(getattr(settings, "TRIPS_PROFILE_MAX_FILES", 200))
+        self.sample_rate = float(getattr(settings, "TRIPS_PROFILE_SAMPLE_RATE", 0.0))
+        self.token = getattr(settings, "TRIPS_PROFILE_TOKEN", "")
+        self.default_mode = getattr(settings, "TRIPS_PROFILE_MODE", "cprofile")
+        if self.default_mode not in MODES:
+            raise ValueError(f"TRIPS_PROFILE_MODE must be one of {MODES}")
+        self._busy = threading.Lock()  # cProfile allows one active profiler per process
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _selected_mode(self, request):
+        """Profiling mode for this request, or None to run it unprofiled."""
+        supplied = request.headers.get("X-Profile", "").encode("utf-8")  # bytes: str compare rejects non-ASCII
+        if self.token and hmac.compare_digest(supplied, self.token.encode("utf-8")):
+            return self.default_mode
+        flag = request.GET.get("profile")
+        if flag:
+            user = getattr(request, "user", None)
+            if user is not None and user.is_staff:
+                return flag if flag in MODES else self.default_mode
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return self.default_mode
+        return None
+
+    def __call__(self, request):
+        mode = self._selected_mode(request)
+        if mode is None or not self._busy.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            return self._profile(request, mode)
+        finally:
+            self._busy.release()
+
+    def _profile(self, request, mode):
+        artifact_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        started = time.perf_counter()
+        if mode == "sample":
+            sampler = StackSampler(threading.get_ident())
+            sampler.start()
+            try:
+                response = self.get_response(request)
+            finally:
+                sampler.stop()
+            path = os.path.join(self.directory, f"{artifact_id}.folded")
+            sampler.write(path)
+        else:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            path = os.path.join(self.directory, f"{artifact_id}.pstats")
+            profiler.dump_stats(path)
+
+        logger.info(
+            "profiled %s %s (%s, %.1f ms) -> %s",
+            request.method, request.path, mode, (time.perf_counter() - started) * 1000.0, path,
+        )
+        self._prune()
+        response["X-Profile-Id"] = artifact_id
+        return response
+
+    def _prune(self):
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.is_file()]
+            if len(entries) <= self.max_files:
+                return
+            entries.sort(key=lambda e: e.stat().st_mtime)
+            for e in entries[: len(entries) - self.max_files]:
+                os.remove(e.path)
+        except OSError:
+            logger.warning("could not prune %s", self.directory, exc_info=True)
@@ -1,6 +1,8 @@
 # trips/serializers.py
 from rest_framework import serializers
 
+from .hos import CYCLE_MAX, DAILY_DRIVE_MAX, DAILY_DUTY_MAX
+
 
 class TripInputSerializer(serializers.Serializer):
     """
@@ -45,3 +47,82 @@ class TripInputSerializer(serializers.Serializer):
                 {"detail": "Current, pickup, and dropoff locations cannot all be the same."}
             )
         return attrs
+
+
+class ReplanInputSerializer(serializers.Serializer):
+    """
+    Input schema for POST /api/trips/<plan_id>/replan/
+    {
+      "current_position": [-97.33, 37.69],   # [lon, lat]
+      "hours_driven_today": 6.5,
+      "duty_window_used": 8.0,
+      "cycle_used": 41.5,
+      "break_taken": true,                    # optional, default false
+      "picked_up": false
+    }
+    """
+    current_position = serializers.ListField(
+        child=serializers.FloatField(),
+        min_length=2,
+        max_length=2,
+        help_text="Driver position as [lon, lat].",
+    )
+    hours_driven_today = serializers.FloatField(
+        min_value=0,
+        max_value=DAILY_DRIVE_MAX,
+        help_text="Hours driven since the last 10-hour off-duty period.",
+    )
+    duty_window_used = serializers.FloatField(
+        min_value=0,
+        max_value=DAILY_DUTY_MAX,
+        help_text="Hours elapsed in the current 14-hour window.",
+    )
+    cycle_used = serializers.FloatField(
+        min_value=0,
+        max_value=CYCLE_MAX,
+        help_text="Hours used in the 70hr/8day cycle, including today.",
+    )
+    break_taken = serializers.BooleanField(
+        default=False,
+        help_text="Whether the 30-minute break has already been taken this shift "
+                  "(the next 8 hours of driving are counted from now).",
+    )
+    picked_up = serializers.BooleanField(
+        help_text="Whether the load has been picked up (which leg of the route the driver is on). "
+                  "Ignored for plans already past the pickup.",
+    )
+
+    def validate_current_position(self, value):
+        lon, lat = value
+        if not (-180.0 <= lon <= 180.0 and -90.0 <= lat <= 90.0):
+            raise serializers.ValidationError("Expected [lon, lat] within valid ranges.")
+        return value
+
+    def validate(self, attrs):
+        if attrs["hours_driven_today"] > attrs["duty_window_used"]:
+            raise serializers.ValidationError(
+                {"hours_driven_today": "Cannot exceed duty_window_used (driving happens inside the window)."}
+            )
+        return attrs
+
+
+class HOSValidateInputSerializer(serializers.Serializer):
+    """
+    Input schema for POST /api/hos/validate/
+    {
+      "drivers": [
+        {
+          "driver_id": "D-102",
+          "cycle_used_before": 12.5,
+          "logs": [{"day": 1, "segments": [{"status": "driving", "hours": 5.5}, ...]}, ...]
+        },
+        ...
+      ]
+    }
+    Per-driver log shape is checked by trips.hos_validator.prepare_fleet (cheaper
+    than nested serializers for a month of fleet logs).
+    """
+    drivers = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+    )
@@ -1,3 +1,556 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import cache as trips_cache
+from . import views
+from .cache import MemoryCache, SharedCache, export_snapshot, load_snapshot
+from .deadline import Deadline, DeadlineExceeded
+from .hos import build_daily_logs
+from .hos_validator import prepare_fleet, validate_fleet
+from .models import TripPlan
+from .logic import METERS_PER_MILE, _haversine_miles, line_from, line_length_miles, project_onto_line
+from .ors import ORSError, _geocode_key, _route_key
+from .ors_stub import fake_geocode, fake_route
+from .views import _fill_precise_route, _remaining_instructions
+
+ABBR = {"off_duty": "OFF", "sleeper_berth": "SB", "driving": "D", "on_duty_not_driving": "ON"}
+
+
+def _compact(logs):
+    return [[(ABBR[s["status"]], s["hours"]) for s in d["segments"]] for d in logs]
+
+
+def _expand(days):
+    """[[("D", 5.0), ...], ...] -> validator day/segment logs, numbered from day 1."""
+    status = {v: k for k, v in ABBR.items()}
+    return [
+        {"day": n, "segments": [{"status": status[code], "hours": h} for code, h in segs]}
+        for n, segs in enumerate(days, 1)
+    ]
+
+
+def _violations(days, cycle_used_before=0.0):
+    drivers = prepare_fleet([{"driver_id": "D-1", "cycle_used_before": cycle_used_before, "logs": _expand(days)}])
+    return [(v["rule"], v["day"], v["value"]) for v in validate_fleet(drivers)]
+
+
+def _notes(logs):
+    return [s.get("note") for d in logs for s in d["segments"] if s.get("note")]
+
+
+class FreshPlanTests(SimpleTestCase):
+    """Golden planner output for fresh plans (no resume clocks)."""
+
+    def test_single_day(self):
+        self.assertEqual(
+            _compact(build_daily_logs(300, 5.5 * 3600, 0)),
+            [[("ON", 1.0), ("D", 5.5), ("ON", 1.0), ("OFF", 16.5)]],
+        )
+
+    def test_multi_day(self):
+        self.assertEqual(
+            _compact(build_daily_logs(1500, 27 * 3600, 20)),
+            [
+                [("ON", 1.0), ("D", 8.0), ("ON", 0.5), ("D", 3.0), ("OFF", 11.5)],
+                [("D", 8.0), ("OFF", 0.5), ("D", 3.0), ("OFF", 12.5)],
+                [("D", 5.0), ("ON", 1.0), ("OFF", 18.0)],
+            ],
+        )
+
+    def test_fuel_stops_and_cycle_reset(self):
+        # 65h used: pickup + 4h driving reach 70h, then the 34h reset
+        logs = build_daily_logs(2429.35, 727.16 / 55 * 3600, 65)
+        self.assertEqual(
+            _compact(logs),
+            [
+                [("ON", 1.0), ("D", 4.0), ("OFF", 19.0)],
+                [("OFF", 24.0)],
+                [("OFF", 10.0)],
+                [("D", 0.41), ("ON", 0.5), ("D", 4.41), ("ON", 0.5), ("D", 4.41), ("ON", 1.0), ("OFF", 12.77)],
+            ],
+        )
+        self.assertEqual(_notes(logs).count("Fuel"), 2)
+
+
+class ResumePlanTests(SimpleTestCase):
+    def test_hours_driven_today_caps_day_one(self):
+        logs = build_daily_logs(
+            300, 5.5 * 3600, 40,
+            hours_driven_today=6.5, duty_window_used=8.0, break_taken=True, pickup_pending=False,
+        )
+        self.assertEqual(
+            _compact(logs),
+            [[("D", 4.5), ("OFF", 11.5)], [("D", 1.0), ("ON", 1.0), ("OFF", 22.0)]],
+        )
+        self.assertNotIn("Pickup", _notes(logs))
+
+    def test_duty_window_used_caps_day_one(self):
+        logs = build_daily_logs(
+            300, 5.5 * 3600, 40,
+            hours_driven_today=2.0, duty_window_used=12.0, break_taken=True, pickup_pending=False,
+        )
+        self.assertEqual(
+            _compact(logs),
+            [[("D", 2.0), ("OFF", 10.0)], [("D", 3.5), ("ON", 1.0), ("OFF", 19.5)]],
+        )
+
+    def test_break_taken(self):
+        clocks = dict(hours_driven_today=8.0, duty_window_used=9.0, pickup_pending=False)
+        without = build_daily_logs(300, 5.5 * 3600, 40, break_taken=False, **clocks)
+        with_break = build_daily_logs(300, 5.5 * 3600, 40, break_taken=True, **clocks)
+        self.assertEqual(_compact(without)[0], [("OFF", 0.5), ("D", 3.0), ("OFF", 11.5)])
+        self.assertEqual(_compact(with_break)[0], [("D", 3.0), ("OFF", 12.0)])
+
+    def test_cycle_left_caps_day_one(self):
+        logs = build_daily_logs(
+            600, 11 * 3600, 69,
+            hours_driven_today=0.5, duty_window_used=1.0, break_taken=True, pickup_pending=False,
+        )
+        self.assertEqual(_compact(logs)[0], [("D", 1.0), ("OFF", 22.0)])
+        self.assertEqual([d["segments"][0]["note"] for d in logs[1:3]], ["34h reset (part 1/2)", "34h reset (part 2/2)"])
+
+    def test_pickup_pending(self):
+        logs = build_daily_logs(300, 5.5 * 3600, 40, hours_driven_today=1.0, duty_window_used=2.0)
+        self.assertEqual(_compact(logs), [[("ON", 1.0), ("D", 5.5), ("ON", 1.0), ("OFF", 14.5)]])
+
+
+class ProjectionTests(SimpleTestCase):
+    LINE = [(-100.0, 40.0), (-99.0, 40.0), (-98.0, 40.0)]
+
+    def test_point_near_line(self):
+        along, off, seg, snapped = project_onto_line(self.LINE, (-99.5, 40.01))
+        self.assertEqual(seg, 0)
+        self.assertAlmostEqual(snapped[0], -99.5, places=6)
+        self.assertAlmostEqual(along, _haversine_miles(self.LINE[0], snapped), places=6)
+        self.assertAlmostEqual(off, 0.69, places=2)
+
+    def test_past_the_end_clamps_to_last_vertex(self):
+        along, _, seg, snapped = project_onto_line(self.LINE, (-97.0, 40.0))
+        self.assertEqual((seg, snapped), (1, (-98.0, 40.0)))
+        self.assertAlmostEqual(along, line_length_miles(self.LINE), places=6)
+
+    def test_route_that_doubles_back(self):
+        # out east to the pickup, back west ~1.4 mi north of the outbound leg, then north
+        line = [(-100.0, 40.0), (-99.0, 40.0), (-99.0, 40.02), (-100.0, 40.02), (-100.0, 41.0)]
+        pickup_at = line_length_miles(line[:2])
+        driver = (-99.9, 40.015)  # nearer the return leg than the outbound one
+        self.assertEqual(project_onto_line(line, driver)[2], 2)
+
+        along, off, seg, _ = project_onto_line(line, driver, 0.0, pickup_at)
+        self.assertEqual(seg, 0)
+        self.assertAlmostEqual(off, 1.04, places=2)
+        self.assertLess(along, 6.0)
+
+        along, off, seg, _ = project_onto_line(line, (-99.9, 40.005), pickup_at)
+        self.assertEqual(seg, 2)
+        self.assertGreater(along, pickup_at + 40.0)
+        self.assertAlmostEqual(off, 1.04, places=2)
+
+    def test_range_clamps_within_a_segment(self):
+        # ~26 mi along the first segment, but the search starts at mile 30
+        along, _, seg, snapped = project_onto_line(self.LINE, (-99.5, 40.0), 30.0)
+        self.assertEqual(seg, 0)
+        self.assertAlmostEqual(along, 30.0, places=1)
+        self.assertGreater(snapped[0], -99.5)
+
+    def test_line_from(self):
+        self.assertEqual(
+            line_from(self.LINE, 0, (-99.5, 40.0)),
+            [(-99.5, 40.0), (-99.0, 40.0), (-98.0, 40.0)],
+        )
+        self.assertEqual(line_from(self.LINE, 1, (-98.0, 40.0)), [(-98.0, 40.0), (-98.0, 40.0)])
+
+    def test_remaining_instructions(self):
+        steps = [{"instruction": n, "distance_meters": 10 * METERS_PER_MILE} for n in "abc"]
+        self.assertEqual([s["instruction"] for s in _remaining_instructions(steps, 0.0)], ["a", "b", "c"])
+        self.assertEqual([s["instruction"] for s in _remaining_instructions(steps, 15.0)], ["b", "c"])
+        self.assertEqual(_remaining_instructions(steps, 30.0), [])
+
+
+class HOSValidatorTests(SimpleTestCase):
+    # 12.5h on duty (10h driving, break at 7.5h) followed by an 11.5h rest
+    WORKDAY = [("ON", 2.0), ("D", 7.5), ("ON", 0.5), ("D", 2.5), ("OFF", 11.5)]
+
+    def test_planner_output_is_clean(self):
+        for miles in (50, 300, 600, 999, 1500, 2429.35, 3100):
+            for mph in (45, 55, 62):
+                for cycle in (0, 20, 45, 65, 69, 70):
+                    with self.subTest(miles=miles, mph=mph, cycle=cycle):
+                        days = _compact(build_daily_logs(miles, miles / mph * 3600, cycle))
+                        self.assertEqual(_violations(days, cycle_used_before=cycle), [])
+
+    def test_resumed_plan_is_clean(self):
+        # 2h driven, break, 1h on duty: the planner's 9 more hours need a second break
+        history = [("D", 2.0), ("ON", 1.0)]
+        logs = build_daily_logs(
+            500, 9 * 3600, 30,
+            hours_driven_today=2.0, duty_window_used=3.0, break_taken=True, pickup_pending=False,
+        )
+        days = _compact(logs)
+        days[0] = history + days[0]
+        self.assertEqual(_violations(days, cycle_used_before=27.0), [])
+
+    def test_11h_driving(self):
+        shift = [("OFF", 10.0), ("D", 6.0), ("ON", 0.5)]
+        self.assertEqual(_violations([shift + [("D", 5.0)]]), [])
+        self.assertEqual(_violations([shift + [("D", 5.1)]]), [("11h_driving", 1, 11.1)])
+
+    def test_14h_window(self):
+        shift = [("ON", 6.0), ("D", 4.0), ("ON", 0.5)]
+        self.assertEqual(_violations([shift + [("D", 3.5)]]), [])
+        self.assertEqual(_violations([shift + [("D", 3.6)]]), [("14h_window", 1, 14.1)])
+
+    def test_30min_break_satisfied_by_on_duty(self):
+        self.assertEqual(_violations([[("D", 8.0), ("ON", 0.5), ("D", 3.0)]]), [])
+        self.assertEqual(
+            _violations([[("D", 8.0), ("ON", 0.4), ("D", 3.0)]]),
+            [("30min_break", 1, 11.0)],
+        )
+        self.assertEqual(_violations([[("D", 8.1)]]), [("30min_break", 1, 8.1)])
+
+    def test_70h_8day(self):
+        self.assertEqual(_violations([self.WORKDAY] * 5 + [[("ON", 2.0), ("D", 5.5)]]), [])
+        self.assertEqual(
+            _violations([self.WORKDAY] * 5 + [[("ON", 2.0), ("D", 5.6)]]),
+            [("70h_8day", 6, 70.1)],
+        )
+
+    def test_34h_restart_clears_8day_sum(self):
+        # day 5's 11.5h rest + day 6 off: 34h restarts the cycle, 33.9h does not
+        restart = [self.WORKDAY] * 5 + [[("OFF", 22.5)], self.WORKDAY]
+        self.assertEqual(_violations(restart), [])
+        short = [self.WORKDAY] * 5 + [[("OFF", 22.4)], self.WORKDAY]
+        self.assertEqual([v[:2] for v in _violations(short)], [("70h_8day", 7), ("70h_8day", 7)])
+
+    def test_cycle_used_before_falls_out_of_window(self):
+        quiet = [[("ON", 1.0), ("OFF", 23.0)]] * 6  # 6h on duty, no 34h rest
+        self.assertEqual(_violations(quiet + [[("ON", 1.0), ("D", 3.0)]], cycle_used_before=60.0), [])
+        self.assertEqual(
+            _violations(quiet + [[("ON", 1.0), ("D", 3.1)]], cycle_used_before=60.0),
+            [("70h_8day", 7, 70.1)],
+        )
+        # from day 8 the window starts at day 1, so the hours before it no longer count
+        day8 = [[("ON", 1.0), ("OFF", 23.0)], [("ON", 1.0), ("D", 7.0)]]
+        self.assertEqual(_violations(quiet + day8, cycle_used_before=60.0), [])
+
+    def test_endpoint_streams_violations_and_summary(self):
+        body = {"drivers": [{"driver_id": "D-1", "logs": _expand([[("D", 8.0), ("ON", 0.4), ("D", 3.0)]])}]}
+        resp = self.client.post(reverse("trips:hos-validate"), data=json.dumps(body), content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        lines = [json.loads(line) for line in b"".join(resp.streaming_content).splitlines()]
+        self.assertEqual(lines[0]["rule"], "30min_break")
+        self.assertEqual(lines[-1]["summary"]["violations"], 1)
+
+    def test_endpoint_rejects_malformed_logs(self):
+        body = {"drivers": [{"logs": [{"day": 1, "segments": [{"status": "flying", "hours": 1}]}]}]}
+        resp = self.client.post(reverse("trips:hos-validate"), data=json.dumps(body), content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("unknown status", resp.json()["detail"])
+        resp = self.client.post(reverse("trips:hos-validate"), data=json.dumps({"drivers": []}), content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+
+
+class CacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def _shared(self, max_bytes=1 << 20):
+        cache = SharedCache(os.path.join(self.dir, "cache.sqlite3"), max_bytes=max_bytes)
+        self.addCleanup(cache.close)
+        return cache
+
+    def _backends(self, max_bytes=1 << 20):
+        return [MemoryCache(max_bytes=max_bytes), self._shared(max_bytes)]
+
+    def test_get_returns_a_fresh_json_copy(self):
+        for cache in self._backends():
+            with self.subTest(type(cache).__name__):
+                cache.set("route", "k", {"instructions": [1, 2], "point": (1.5, 2.5)})
+                value = cache.get("route", "k")
+                self.assertEqual(value, {"instructions": [1, 2], "point": [1.5, 2.5]})
+                value["instructions"].append(3)
+                self.assertEqual(cache.get("route", "k")["instructions"], [1, 2])
+
+    def test_lru_eviction(self):
+        # each value serializes to 10 bytes: a 35-byte budget holds 3, a 4th evicts down to 31.5
+        for cache in self._backends(max_bytes=35):
+            with self.subTest(type(cache).__name__):
+                for key in "abc":
+                    cache.set("geocode", key, "x" * 8)
+                if isinstance(cache, SharedCache):
+                    cache._conn().execute("UPDATE entries SET accessed_at = 1 WHERE key = 'b'")
+                else:
+                    cache.get("geocode", "a")  # a becomes most recent, b least
+                cache.set("geocode", "d", "x" * 8)
+                self.assertIsNone(cache.get("geocode", "b"))
+                self.assertEqual(cache.stats()["geocode"]["evictions"], 1)
+                self.assertEqual(cache.stats()["geocode"]["bytes"], 30)
+
+    def test_byte_total_follows_every_write(self):
+        cache = self._shared()
+
+        def total():
+            return cache._conn().execute("SELECT value FROM meta WHERE name = 'bytes'").fetchone()[0]
+
+        cache.set("geocode", "a", "x" * 8)
+        cache.set("route", "b", [1, 2, 3])
+        self.assertEqual(total(), 10 + 7)
+        cache.set("geocode", "a", "x")      # replace: the total moves by the size difference
+        self.assertEqual(total(), 3 + 7)
+        cache.add("geocode", "a", "x" * 50)  # no-op
+        cache.delete("route", "b")
+        self.assertEqual(total(), 3)
+        cache.clear()
+        self.assertEqual(total(), 0)
+
+    def test_add_keeps_existing_values(self):
+        for cache in self._backends():
+            with self.subTest(type(cache).__name__):
+                self.assertTrue(cache.add("geocode", "a", [1, 1]))
+                self.assertFalse(cache.add("geocode", "a", [2, 2]))
+                self.assertEqual(cache.get("geocode", "a"), [1, 1])
+
+    def test_snapshot_round_trip(self):
+        source = self._shared()
+        source.set("geocode", "chicago, il", [-87.63, 41.88])
+        source.set("route", "r1", {"distance_miles": 12.5})
+        source.set("other", "skip", 1)
+        path = os.path.join(self.dir, "snap.jsonl.gz")
+        self.assertEqual(export_snapshot(source, path), {"geocode": 1, "route": 1})
+
+        target = MemoryCache()
+        target.set("geocode", "chicago, il", [-87.6, 41.9])  # newer value wins over the snapshot
+        self.assertEqual(load_snapshot(target, path), {"route": 1})
+        self.assertEqual(target.get("geocode", "chicago, il"), [-87.6, 41.9])
+        self.assertEqual(target.get("route", "r1"), {"distance_miles": 12.5})
+        self.assertIsNone(target.get("other", "skip"))
+
+
+class ReplanViewTests(TestCase):
+    # current -> pickup 1 degree east, then back west ~0.7 mi north of the way out
+    LINE = [[-100.0, 40.0], [-99.0, 40.0], [-99.0, 40.01], [-101.0, 40.01]]
+
+    def setUp(self):
+        length = line_length_miles(self.LINE)
+        self.pickup_miles = line_length_miles(self.LINE[:2])
+        self.plan = TripPlan.objects.create(
+            inputs={"current_cycle_used": 10},
+            waypoints={"current": self.LINE[0], "pickup": self.LINE[1], "dropoff": self.LINE[-1]},
+            line_coords=self.LINE,
+            distance_miles=length,
+            duration_seconds=length / 55.0 * 3600,
+            pickup_miles=self.pickup_miles,
+        )
+
+    def _replan(self, **body):
+        body = {"hours_driven_today": 2.0, "duty_window_used": 3.0, "cycle_used": 12.0, **body}
+        return self.client.post(
+            reverse("trips:replan", args=[self.plan.public_id]), data=json.dumps(body), content_type="application/json",
+        )
+
+    def test_driver_on_the_return_leg(self):
+        resp = self._replan(current_position=[-99.9, 40.01], picked_up=True)
+        self.assertEqual(resp.status_code, 200)
+        progress = resp.json()["progress"]
+        self.assertFalse(progress["pickup_pending"])
+        self.assertFalse(progress["rerouted"])
+        back = _haversine_miles(self.LINE[2], (-99.9, 40.01))
+        self.assertAlmostEqual(progress["miles_done"], self.pickup_miles + 0.69 + back, delta=0.1)
+        self.assertNotIn("Pickup", _notes(resp.json()["logs"]))
+
+    def test_driver_on_the_way_to_pickup(self):
+        resp = self._replan(current_position=[-99.9, 40.01], picked_up=False)
+        progress = resp.json()["progress"]
+        self.assertTrue(progress["pickup_pending"])
+        self.assertAlmostEqual(progress["miles_done"], 5.3, delta=0.1)
+        self.assertEqual(_notes(resp.json()["logs"])[0], "Pickup")
+
+    def test_plans_are_addressed_by_uuid(self):
+        child_id = self._replan(current_position=[-99.9, 40.01], picked_up=True).json()["plan_id"]
+        detail = self.client.get(reverse("trips:plan-detail", args=[child_id]))
+        self.assertEqual(detail.status_code, 200)
+        self.assertEqual(detail.json()["replanned_from"], str(self.plan.public_id))
+        self.assertEqual(self.client.get(f"/api/trips/{self.plan.pk}/").status_code, 404)
+
+    def test_picked_up_is_required(self):
+        resp = self._replan(current_position=[-99.9, 40.01])
+        self.assertEqual(resp.status_code, 400)
+        self.assertIn("picked_up", resp.json())
+
+
+class DeadlineTests(SimpleTestCase):
+    def test_remaining_and_timeout(self):
+        deadline = Deadline(60)
+        self.assertFalse(deadline.expired)
+        self.assertTrue(59 < deadline.remaining() <= 60)
+        self.assertEqual(deadline.timeout(20), 20)
+        self.assertTrue(59 < deadline.timeout(120) <= 60)
+
+    def test_expired(self):
+        deadline = Deadline(0)
+        self.assertTrue(deadline.expired)
+        self.assertEqual(deadline.remaining(), 0.0)
+        with self.assertRaises(DeadlineExceeded):
+            deadline.timeout(20)
+
+
+def _fake_geocode(query, deadline=None, check_cache=True):
+    return fake_geocode(query)
+
+
+def _fake_route(coords, check_cache=True):
+    # the stub's GeoJSON, in the shape ors.route() returns
+    feature = fake_route([tuple(c) for c in coords])["features"][0]
+    props = feature["properties"]
+    return {
+        "line_coords": feature["geometry"]["coordinates"],
+        "distance_miles": props["summary"]["distance"] / METERS_PER_MILE,
+        "duration_seconds": props["summary"]["duration"],
+        "segments": props["segments"],
+        "instructions": [],
+    }
+
+
+@override_settings(TRIPS_PLAN_BUDGET_SECONDS=5)
+class PlanBudgetTests(TestCase):
+    """POST /api/trips/ against a mocked ORS: each way of (not) meeting the planning budget."""
+
+    BODY = {"current_location": "A", "pickup_location": "B", "dropoff_location": "C", "current_cycle_used": 10}
+
+    def setUp(self):
+        self.cache = MemoryCache()
+        patcher = mock.patch.object(trips_cache, "_cache", self.cache)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.geocode = self._patch("geocode", side_effect=_fake_geocode)
+        self.route = self._patch("route", side_effect=_fake_route)
+        self.refine_later = self._patch("_refine_later")
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)  # never leave a pool thread blocked
+
+    def _patch(self, name, **kwargs):
+        patcher = mock.patch.object(views, name, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def _plan(self):
+        resp = self.client.post(reverse("trips:plan"), data=json.dumps(self.BODY), content_type="application/json")
+        return resp, TripPlan.objects.filter(public_id=resp.json()["plan_id"]).first() if resp.status_code == 200 else None
+
+    def _slow_route(self, result=None, exc=None):
+        def slow(coords, check_cache=True):
+            self.release.wait(5)
+            if exc is not None:
+                raise exc
+            return result or _fake_route(coords)
+        self.route.side_effect = slow
+
+    def _stops(self):
+        return [list(fake_geocode(q)) for q in ("A", "B", "C")]
+
+    def test_on_time(self):
+        resp, plan = self._plan()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.json()["degraded"], resp.json()["refining"]), (False, False))
+        self.assertEqual((plan.degraded, plan.refining), (False, False))
+        self.assertEqual(plan.line_coords, _fake_route(self._stops())["line_coords"])
+        self.refine_later.assert_not_called()
+
+    def test_geocodes_run_concurrently(self):
+        together = threading.Barrier(3, timeout=2)  # breaks (and fails the plan) unless all three overlap
+
+        def geocode(query, deadline=None, check_cache=True):
+            together.wait()
+            return fake_geocode(query)
+        self.geocode.side_effect = geocode
+        self.assertEqual(self._plan()[0].status_code, 200)
+
+    def test_ors_error_falls_back_to_estimate(self):
+        self.route.side_effect = ORSError("Route failed: 503")
+        resp, plan = self._plan()
+        self.assertEqual((resp.json()["degraded"], resp.json()["refining"]), (True, False))
+        self.assertEqual((plan.degraded, plan.refining), (True, False))
+        self.refine_later.assert_not_called()
+
+    @override_settings(TRIPS_PLAN_BUDGET_SECONDS=0.3)
+    def test_slow_route_is_refined_in_background(self):
+        self._slow_route()
+        resp, plan = self._plan()
+        self.assertEqual((resp.json()["degraded"], resp.json()["refining"]), (True, True))
+        self.assertEqual((plan.degraded, plan.refining), (True, True))
+
+        plan_pk, future = self.refine_later.call_args.args
+        self.release.set()
+        future.result(timeout=5)
+        with mock.patch.object(views, "close_old_connections"):  # would end the test's transaction
+            _fill_precise_route(plan_pk, future)
+        plan.refresh_from_db()
+        self.assertEqual((plan.degraded, plan.refining), (False, False))
+        self.assertEqual(plan.line_coords, _fake_route(self._stops())["line_coords"])
+        detail = self.client.get(reverse("trips:plan-detail", args=[plan.public_id])).json()
+        self.assertEqual((detail["degraded"], detail["refining"]), (False, False))
+
+    @override_settings(TRIPS_PLAN_BUDGET_SECONDS=0.3)
+    def test_failed_refine_keeps_the_estimate(self):
+        self._slow_route(exc=ORSError("Route failed: 503"))
+        resp, plan = self._plan()
+        estimate = plan.line_coords
+
+        plan_pk, future = self.refine_later.call_args.args
+        self.release.set()
+        with mock.patch.object(views, "close_old_connections"), self.assertLogs("trips.views", "WARNING"):
+            _fill_precise_route(plan_pk, future)
+        plan.refresh_from_db()
+        self.assertEqual((plan.degraded, plan.refining), (True, False))
+        self.assertEqual(plan.line_coords, estimate)
+
+    def test_saturated_pool_answers_with_estimate(self):
+        taken = 0
+        while views._route_slots.acquire(blocking=False):
+            taken += 1
+        self.addCleanup(lambda: [views._route_slots.release() for _ in range(taken)])
+
+        resp, plan = self._plan()
+        self.assertEqual((resp.json()["degraded"], resp.json()["refining"]), (True, False))
+        self.assertEqual((plan.degraded, plan.refining), (True, False))
+        self.route.assert_not_called()
+
+    @override_settings(TRIPS_PLAN_BUDGET_SECONDS=0.1)
+    def test_slow_geocode_is_504(self):
+        def geocode(query, deadline=None, check_cache=True):
+            self.release.wait(5)
+            return fake_geocode(query)
+        self.geocode.side_effect = geocode
+        resp, _ = self._plan()
+        self.assertEqual(resp.status_code, 504)
+        self.assertFalse(TripPlan.objects.exists())
+
+    def test_geocode_deadline_exceeded_is_504(self):
+        self.geocode.side_effect = DeadlineExceeded("planning budget of 5s exhausted")
+        self.assertEqual(self._plan()[0].status_code, 504)
+
+    @override_settings(TRIPS_PLAN_BUDGET_SECONDS=0)
+    def test_cache_hits_need_no_budget_or_slot(self):
+        stops = self._stops()
+        for query, point in zip("ABC", stops):
+            self.cache.set("geocode", _geocode_key(query), point)
+        self.cache.set("route", _route_key(stops), _fake_route(stops))
+        taken = 0
+        while views._route_slots.acquire(blocking=False):
+            taken += 1
+        self.addCleanup(lambda: [views._route_slots.release() for _ in range(taken)])
+
+        resp, plan = self._plan()
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((plan.degraded, plan.refining), (False, False))
+        self.geocode.assert_not_called()
+        self.route.assert_not_called()
+        self.assertEqual(self.cache.stats()["route"]["misses"], 0)
@@ -1,9 +1,12 @@
 from django.urls import path
-from .views import TripPlanView, ping  # keep ping if you added it earlier
+from .views import TripPlanView, TripPlanDetailView, TripReplanView, HOSValidateView, ping  # keep ping if you added it earlier
 
 app_name = "trips"  # optional but recommended for namespacing
 
 urlpatterns = [
     path("ping/", ping, name="ping"),                       # GET /api/ping/
     path("trips/", TripPlanView.as_view(), name="plan"),    # POST /api/trips/
+    path("trips/<uuid:plan_id>/", TripPlanDetailView.as_view(), name="plan-detail"),  # GET /api/trips/<id>/
+    path("trips/<uuid:plan_id>/replan/", TripReplanView.as_view(), name="replan"),  # POST /api/trips/<id>/replan/
+    path("hos/validate/", HOSValidateView.as_view(), name="hos-validate"),  # POST /api/hos/validate/
 ]
@@ -1,13 +1,259 @@
 # trips/views.py
-from django.http import JsonResponse
+import json
+import logging
+import threading
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+
+import requests
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
-from .serializers import TripInputSerializer
-from .ors import geocode, route
-from .logic import compute_fuel_stops_along_line
+from .models import TripPlan
+from .serializers import TripInputSerializer, ReplanInputSerializer, HOSValidateInputSerializer
+from .ors import ORSError, cached_geocode, cached_route, geocode, route
+from .deadline import Deadline, DeadlineExceeded
+from .logic import (
+    METERS_PER_MILE,
+    ROAD_CIRCUITY,
+    compute_fuel_stops_along_line,
+    estimate_route,
+    line_from,
+    line_length_miles,
+    project_onto_line,
+)
 from .hos import build_daily_logs  # real HOS planner
+from .hos_validator import LogFormatError, RULES, prepare_fleet, validate_fleet
+
+logger = logging.getLogger(__name__)
+
+# Further than this from the stored route and a re-plan asks ORS for a new one.
+OFF_ROUTE_MILES = 5.0
+# Part of the planning budget kept back for fuel stops, HOS and saving the plan.
+PLAN_RESERVE_SECONDS = 0.25
+# ORS route calls in flight per process. One worker per slot, so a call never
+# waits in the pool's queue; when every slot is taken, plans go straight to the estimate.
+ROUTE_WORKERS = 8
+# Geocode calls in flight per process (a plan needs up to three). Queued calls
+# still answer to the plan's deadline, so no slots are needed here.
+GEOCODE_WORKERS = 16
+
+
+class StageTimer:
+    """
+    Wall-clock timings for the planning stages, reported to clients (and the
+    replay harness) as a Server-Timing header: "geocode;dur=12.3, route;dur=...".
+    """
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, (time.perf_counter() - started) * 1000.0))
+
+    def header(self):
+        return ", ".join(f"{name};dur={ms:.1f}" for name, ms in self.stages)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+_route_slots = threading.BoundedSemaphore(ROUTE_WORKERS)
+
+
+def _executor(name, max_workers):
+    # Built lazily so that no threads exist in the gunicorn --preload master.
+    pool = _pools.get(name)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(name)
+            if pool is None:
+                pool = _pools[name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+    return pool
+
+
+def _geocode_all(queries, deadline):
+    """
+    Geocode `queries` concurrently against one deadline, in order. Cache hits
+    are served from the request thread; DeadlineExceeded once the budget runs out.
+    """
+    points = [cached_geocode(q) for q in queries]
+    futures = {
+        i: _executor("ors-geocode", GEOCODE_WORKERS).submit(geocode, q, deadline, check_cache=False)
+        for i, q in enumerate(queries) if points[i] is None
+    }
+    try:
+        for i, future in futures.items():
+            points[i] = future.result(timeout=deadline.remaining())
+    except FutureTimeout as exc:
+        raise DeadlineExceeded(f"geocoding did not finish within the {deadline.budget:g}s planning budget") from exc
+    finally:
+        for future in futures.values():
+            future.cancel()  # no-op for calls already running or done
+    return points
+
+
+def _submit_route(coords, check_cache=True):
+    """Start an ORS route call on the pool, or return None if all ROUTE_WORKERS are busy."""
+    if not _route_slots.acquire(blocking=False):
+        return None
+    try:
+        future = _executor("ors-route", ROUTE_WORKERS).submit(route, coords, check_cache=check_cache)
+    except BaseException:
+        _route_slots.release()
+        raise
+    future.add_done_callback(lambda _: _route_slots.release())
+    return future
+
+
+def _route_within(coords, deadline):
+    """
+    Route via ORS, but stop waiting when the planning budget runs out.
+
+    Returns (route_dict, degraded, pending): on time, the ORS route; otherwise a
+    straight-line estimate (logic.estimate_route) plus the still-running ORS
+    future, which the caller hands to _refine_later. ORS failures, and a
+    saturated route pool, also fall back to the estimate (with nothing pending).
+    A cached route is returned straight away, without a slot or any budget left.
+    """
+    hit = cached_route(coords)
+    if hit is not None:
+        return hit, False, None
+    future = _submit_route(coords, check_cache=False)
+    if future is None:
+        logger.warning("all %d route workers busy; answering with an estimate", ROUTE_WORKERS)
+        return estimate_route(coords), True, None
+    try:
+        return future.result(timeout=max(deadline.remaining() - PLAN_RESERVE_SECONDS, 0.0)), False, None
+    except FutureTimeout:
+        logger.warning("route missed the %.1fs planning budget; answering with an estimate", deadline.budget)
+        return estimate_route(coords), True, future
+    except (ORSError, requests.RequestException) as exc:
+        logger.warning("route failed (%s); answering with an estimate", exc)
+        return estimate_route(coords), True, None
+
+
+def _refine_later(plan_id, future):
+    """Fill the plan in once the ORS call finishes (on the pool thread that ran it)."""
+    future.add_done_callback(partial(_fill_precise_route, plan_id))
+
+
+def _fill_precise_route(plan_id, future):
+    """Swap the routed geometry into a degraded plan; on failure just stop refining."""
+    try:
+        r = future.result()
+    except Exception:
+        logger.warning("background route for plan %s failed; keeping the estimate", plan_id, exc_info=True)
+        try:
+            TripPlan.objects.filter(pk=plan_id).update(refining=False)
+        finally:
+            close_old_connections()
+        return
+    try:
+        plan = TripPlan.objects.filter(pk=plan_id, degraded=True).first()
+        if plan is None:
+            return
+        plan.line_coords = r["line_coords"]
+        plan.distance_miles = float(r["distance_miles"])
+        plan.duration_seconds = float(r["duration_seconds"])
+        plan.instructions = r.get("instructions", [])
+        if plan.pickup_miles is not None:
+            plan.pickup_miles = _first_leg_miles(r)
+        plan.degraded = False
+        plan.refining = False
+        plan.save()
+    finally:
+        close_old_connections()
+
+
+def _first_leg_miles(r):
+    """Road miles of the first ORS leg (current -> pickup)."""
+    segments = r.get("segments") or []
+    return float(segments[0].get("distance") or 0.0) / METERS_PER_MILE if segments else 0.0
+
+
+def _remaining_instructions(instructions, miles_done):
+    """Drop the steps the driver has already completed."""
+    done_m = miles_done * METERS_PER_MILE
+    out, end_m = [], 0.0
+    for step in instructions or []:
+        end_m += float(step.get("distance_meters") or 0.0)
+        if end_m > done_m:
+            out.append(step)
+    return out
+
+
+def _fuel_stops(plan):
+    # Estimated plans hold straight-line geometry: space stops in straight-line miles.
+    k = ROAD_CIRCUITY if plan.degraded else 1.0
+    return compute_fuel_stops_along_line(plan.line_coords, plan.distance_miles / k, 1000.0 / k)
+
+
+def _daily_logs(plan):
+    inputs = plan.inputs
+    if "cycle_used" in inputs:  # re-plan: resume from the driver's reported clocks
+        return build_daily_logs(
+            distance_miles=plan.distance_miles,
+            route_drive_seconds=plan.duration_seconds,
+            current_cycle_used_hours=float(inputs["cycle_used"]),
+            hours_driven_today=float(inputs["hours_driven_today"]),
+            duty_window_used=float(inputs["duty_window_used"]),
+            break_taken=bool(inputs.get("break_taken")),
+            pickup_pending=plan.pickup_miles is not None,
+        )
+    return build_daily_logs(
+        distance_miles=plan.distance_miles,
+        route_drive_seconds=plan.duration_seconds,
+        current_cycle_used_hours=float(inputs.get("current_cycle_used", 0)),
+    )
+
+
+def _plan_response(plan, timer, *, segments=(), **extra):
+    # 3) Fueling stops (every ~1000 miles along the line)
+    with timer.stage("fuel"):
+        fuel = _fuel_stops(plan)
+
+    # 4) Real HOS logs
+    with timer.stage("hos"):
+        logs = _daily_logs(plan)
+
+    response = Response({
+        "plan_id": str(plan.public_id),
+        "degraded": plan.degraded,
+        "refining": plan.refining,
+        "inputs": plan.inputs,
+        "route": {
+            "geometry": {"type": "LineString", "coordinates": plan.line_coords},
+            "summary": {
+                "distance_miles": round(plan.distance_miles, 2),
+                "duration_seconds": plan.duration_seconds,
+            },
+            # NEW: pass through for the "Instructions" tab
+            "instructions": plan.instructions,
+            "segments": list(segments),
+        },
+        "waypoints": plan.waypoints,
+        "stops": {"fueling": fuel},
+        "logs": logs,
+        **extra,
+    }, status=status.HTTP_200_OK)
+    response["Server-Timing"] = timer.header()
+    return response
+
+
+def _deadline_exceeded(exc):
+    return Response({"detail": str(exc)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
 
 
 class TripPlanView(APIView):
@@ -19,53 +265,195 @@ class TripPlanView(APIView):
       "dropoff_location": "Dallas, TX",
       "current_cycle_used": 20
     }
+
+    Answers within TRIPS_PLAN_BUDGET_SECONDS: if ORS routing is slower than
+    that, the plan is built on a straight-line estimate and returned with
+    "degraded": true; while "refining" is true the routed geometry is still
+    on its way and replaces it in the background (GET /api/trips/<plan_id>/).
     """
     def post(self, request):
         ser = TripInputSerializer(data=request.data)
         ser.is_valid(raise_exception=True)
         data = ser.validated_data
+        timer = StageTimer()
+        deadline = Deadline(settings.TRIPS_PLAN_BUDGET_SECONDS)
 
         # 1) Geocode
-        cur = geocode(data["current_location"])
-        pick = geocode(data["pickup_location"])
-        drop = geocode(data["dropoff_location"])
+        with timer.stage("geocode"):
+            try:
+                cur, pick, drop = _geocode_all(
+                    [data["current_location"], data["pickup_location"], data["dropoff_location"]], deadline,
+                )
+            except DeadlineExceeded as exc:
+                return _deadline_exceeded(exc)
 
         # 2) Route (cur -> pick -> drop)  [includes instructions & segments]
         coords = [list(cur), list(pick), list(drop)]
-        r = route(coords)  # dict: { line_coords, distance_miles, duration_seconds, instructions, segments }
+        with timer.stage("route"):
+            r, degraded, pending = _route_within(coords, deadline)  # dict: { line_coords, distance_miles, duration_seconds, instructions, segments }
 
-        # 3) Fueling stops (every ~1000 miles along the line)
-        fuel = compute_fuel_stops_along_line(
-            r["line_coords"], r["distance_miles"], 1000.0
-        )
+        # Keep the plan so the trip can be re-planned without re-routing
+        with timer.stage("save"):
+            plan = TripPlan.objects.create(
+                inputs=data,
+                waypoints={"current": list(cur), "pickup": list(pick), "dropoff": list(drop)},
+                line_coords=r["line_coords"],
+                distance_miles=float(r["distance_miles"]),
+                duration_seconds=float(r["duration_seconds"]),
+                pickup_miles=_first_leg_miles(r),
+                instructions=r.get("instructions", []),
+                degraded=degraded,
+                refining=pending is not None,
+            )
+        if pending is not None:
+            _refine_later(plan.pk, pending)
 
-        # 4) Real HOS logs
-        logs = build_daily_logs(
-            distance_miles=float(r["distance_miles"]),
-            route_drive_seconds=float(r["duration_seconds"]),
-            current_cycle_used_hours=float(data.get("current_cycle_used", 0)),
-        )
+        return _plan_response(plan, timer, segments=[] if degraded else r.get("segments", []))
 
-        return Response({
-            "inputs": data,
-            "route": {
-                "geometry": {"type": "LineString", "coordinates": r["line_coords"]},
-                "summary": {
-                    "distance_miles": round(r["distance_miles"], 2),
-                    "duration_seconds": r["duration_seconds"],
-                },
-                # NEW: pass through for the "Instructions" tab
-                "instructions": r.get("instructions", []),
-                "segments": r.get("segments", []),
-            },
-            "waypoints": {
-                "current": list(cur),
-                "pickup": list(pick),
-                "dropoff": list(drop),
+
+class TripPlanDetailView(APIView):
+    """
+    GET /api/trips/<plan_id>/
+
+    The stored plan with fuel stops and HOS logs rebuilt from it; poll this
+    after a degraded answer, until "refining" is false, to pick up the routed
+    geometry.
+    """
+    def get(self, request, plan_id):
+        plan = get_object_or_404(TripPlan.objects.select_related("parent"), public_id=plan_id)
+        extra = {"replanned_from": str(plan.parent.public_id)} if plan.parent else {}
+        return _plan_response(plan, StageTimer(), **extra)
+
+
+class TripReplanView(APIView):
+    """
+    POST /api/trips/<plan_id>/replan/
+    {
+      "current_position": [-97.33, 37.69],
+      "hours_driven_today": 6.5,
+      "duty_window_used": 8.0,
+      "cycle_used": 41.5,
+      "break_taken": true,
+      "picked_up": false
+    }
+
+    Snaps the driver onto the stored route (onto the pickup leg, or the part
+    after it, per `picked_up`: a route that doubles back passes the same place
+    twice), keeps the remaining geometry and
+    resumes the HOS planner from the reported clocks. ORS is only called when
+    the driver is more than OFF_ROUTE_MILES off the route (within the same
+    planning budget as POST /api/trips/). The result is stored as a new plan
+    (with `parent` set) so it can be re-planned again.
+    """
+    def post(self, request, plan_id):
+        ser = ReplanInputSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        data = ser.validated_data
+        timer = StageTimer()
+        deadline = Deadline(settings.TRIPS_PLAN_BUDGET_SECONDS)
+        prev = get_object_or_404(TripPlan, public_id=plan_id)
+        pos = tuple(data["current_position"])
+
+        # 1) Where is the driver along the stored route? (polyline miles -> road miles)
+        with timer.stage("project"):
+            line_miles = line_length_miles(prev.line_coords)
+            scale = prev.distance_miles / line_miles if line_miles > 0 else 1.0
+            pickup_pending = prev.pickup_miles is not None and not data["picked_up"]
+            if prev.pickup_miles is None:
+                leg = (0.0, None)
+            elif pickup_pending:
+                leg = (0.0, prev.pickup_miles / scale)
+            else:
+                leg = (prev.pickup_miles / scale, None)
+            along, off_route, seg_index, snapped = project_onto_line(prev.line_coords, pos, *leg)
+            miles_done = min(along * scale, prev.distance_miles)
+
+        # 2) Remaining route: reuse the stored geometry unless the driver left it
+        rerouted = off_route > OFF_ROUTE_MILES
+        segments, pending, degraded = [], None, prev.degraded
+        stops = [list(pos)]
+        if pickup_pending:
+            stops.append(prev.waypoints["pickup"])
+        stops.append(prev.waypoints["dropoff"])
+        if rerouted:
+            with timer.stage("route"):
+                r, degraded, pending = _route_within(stops, deadline)
+            line_coords = r["line_coords"]
+            distance_miles = float(r["distance_miles"])
+            duration_seconds = float(r["duration_seconds"])
+            instructions = r.get("instructions", [])
+            pickup_miles = _first_leg_miles(r) if pickup_pending else None
+            segments = r.get("segments", []) if not degraded else []
+        else:
+            frac_left = 1.0 - (miles_done / prev.distance_miles if prev.distance_miles > 0 else 1.0)
+            line_coords = [list(p) for p in line_from(prev.line_coords, seg_index, snapped)]
+            distance_miles = prev.distance_miles - miles_done
+            duration_seconds = prev.duration_seconds * frac_left
+            instructions = _remaining_instructions(prev.instructions, miles_done)
+            pickup_miles = max(prev.pickup_miles - miles_done, 0.0) if pickup_pending else None
+            if degraded:
+                # still an estimate: ask ORS again for the remaining stops, in the background
+                pending = _submit_route(stops)
+
+        with timer.stage("save"):
+            plan = TripPlan.objects.create(
+                parent=prev,
+                inputs=data,
+                waypoints={**prev.waypoints, "current": list(pos)},
+                line_coords=line_coords,
+                distance_miles=distance_miles,
+                duration_seconds=duration_seconds,
+                pickup_miles=pickup_miles,
+                instructions=instructions,
+                degraded=degraded,
+                refining=pending is not None,
+            )
+        if pending is not None:
+            _refine_later(plan.pk, pending)
+
+        # 3) Fuel stops + HOS planner resumed from the driver's current clocks
+        return _plan_response(
+            plan, timer, segments=segments,
+            replanned_from=str(prev.public_id),
+            progress={
+                "miles_done": round(miles_done, 2),
+                "miles_off_route": round(off_route, 2),
+                "rerouted": rerouted,
+                "pickup_pending": pickup_pending,
             },
-            "stops": {"fueling": fuel},
-            "logs": logs,
-        }, status=status.HTTP_200_OK)
+        )
+
+
+class HOSValidateView(APIView):
+    """
+    POST /api/hos/validate/   (body: see HOSValidateInputSerializer)
+
+    Streams newline-delimited JSON: one line per violation
+      {"driver_id": "D-102", "rule": "11h_driving", "day": 3, "segment": 4, "value": 11.5, "limit": 11.0}
+    followed by a summary line
+      {"summary": {"drivers": 250, "segments": 61234, "violations": 17, "by_rule": {...}}}
+    """
+    def post(self, request):
+        ser = HOSValidateInputSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        try:
+            drivers = prepare_fleet(ser.validated_data["drivers"])
+        except LogFormatError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        def stream():
+            by_rule = dict.fromkeys(RULES, 0)
+            for v in validate_fleet(drivers):
+                by_rule[v["rule"]] += 1
+                yield json.dumps(v) + "\n"
+            yield json.dumps({"summary": {
+                "drivers": len(drivers),
+                "segments": sum(len(d.hours) for d in drivers),
+                "violations": sum(by_rule.values()),
+                "by_rule": by_rule,
+            }}) + "\n"
+
+        return StreamingHttpResponse(stream(), content_type="application/x-ndjson")
 
 
 def ping(request):